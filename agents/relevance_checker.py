@@ -1,10 +1,45 @@
-from providers import GeminiClient, OpenAIClient
+from providers import get_gemini, get_openai, get_embeddings, hedged_generate, request_key
 from config.settings import settings
+from utils.compression import compress_context, page_content
+from utils.llm_cache import LLMCache
+import asyncio
+import hashlib
+import numpy as np
 import re
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Single-pass label scan. "PART" catches "PART", "PARTIAL", "PARTIALLY", or "PART..."
+_LABEL_RE = re.compile(r"(CAN_ANSWER|NO_MATCH|PART)")
+_LABELS = {"CAN_ANSWER": "CAN_ANSWER", "PART": "PARTIAL", "NO_MATCH": "NO_MATCH"}
+
+# Static part of the prompt. Kept first and identical across requests so providers can prefix-cache it.
+_INSTRUCTIONS_PREFIX = """You are an AI relevance checker.
+Classify how well the document content addresses the user's question.
+
+**Instructions:**
+- Respond with ONLY one label: CAN_ANSWER, PARTIAL, or NO_MATCH.
+- Do not provide any explanation.
+
+**Labels:**
+1) "CAN_ANSWER": The passages contain enough information to fully answer.
+2) "PARTIAL": The passages discuss the topic but lack some details.
+3) "NO_MATCH": The passages do not mention the topic at all.
+
+---
+"""
+
+def _find_vector_store(retriever):
+    """The Chroma store behind a vector retriever, or the vector half of an ensemble."""
+    if hasattr(retriever, "vectorstore"):
+        return retriever.vectorstore
+    for sub_retriever in getattr(retriever, "retrievers", []):
+        if hasattr(sub_retriever, "vectorstore"):
+            return sub_retriever.vectorstore
+    return None
+
+
 class RelevanceChecker:
     def __init__(self):
         """
@@ -13,116 +48,207 @@ class RelevanceChecker:
         """
         # 1. Initialize Primary (Gemini)
         try:
-            self.primary_client = GeminiClient(api_key=settings.GOOGLE_API_KEY)
+            self.primary_client = get_gemini()
             logger.info("RelevanceChecker: Primary (Gemini) initialized.")
         except Exception as e:
-            logger.warning(f"RelevanceChecker: Could not init Gemini: {e}")
+            logger.warning("RelevanceChecker: Could not init Gemini: %s", e)
             self.primary_client = None
 
         # 2. Initialize Secondary (OpenAI)
         try:
-            self.secondary_client = OpenAIClient(api_key=settings.OPENAI_API_KEY)
+            self.secondary_client = get_openai()
             logger.info("RelevanceChecker: Secondary (OpenAI) initialized.")
         except Exception as e:
-            logger.warning(f"RelevanceChecker: Could not init OpenAI: {e}")
+            logger.warning("RelevanceChecker: Could not init OpenAI: %s", e)
             self.secondary_client = None
 
-    def _get_llm_response(self, prompt: str) -> str:
+        # 3. Response cache (exact prompt match + semantic question match)
+        try:
+            embeddings = get_embeddings()
+        except Exception as e:
+            logger.warning("RelevanceChecker: Semantic cache disabled, could not init embeddings: %s", e)
+            embeddings = None
+        self.cache = LLMCache(
+            embeddings=embeddings,
+            threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+            redis_url=settings.REDIS_URL
+        )
+
+    @staticmethod
+    def _stream_label(client, prompt: str, constraints: dict) -> str:
+        """
+        Read the response stream only until a label shows up, then close it.
+        Falls back to a regular call if streaming fails before any text arrived.
+        """
+        buf = ""
+        try:
+            stream = client.generate_stream(prompt, **constraints)
+            try:
+                for chunk in stream:
+                    buf += chunk.upper()
+                    if _LABEL_RE.search(buf):
+                        break
+            finally:
+                stream.close()
+        except Exception as e:
+            if buf:
+                raise
+            logger.debug("%s streaming failed (%s), retrying without streaming.", client.name, e)
+            return client.generate(prompt, **constraints)
+        return buf
+
+    async def _get_llm_response(self, prompt: str) -> str:
         """
         INTERNAL HELPER: Handles the fallback logic.
         Returns the raw string from whichever model works.
         """
-        # 100 tokens is a safe buffer for 'Thinking' models to reach the final word
+        # The answer is a single label. Thinking is switched off so the whole
+        # (small) budget goes to the label instead of hidden reasoning.
         constraints = {
-            "max_tokens": 1000,
-            "temperature": 0.0
+            "max_tokens": 32,
+            "temperature": 0.0,
+            "thinking_budget": 0
         }
 
-        # 1. Try Primary (Gemini)
-        if self.primary_client:
-            try:
-                print("--- RelevanceChecker: Attempting Gemini ---")
-                return self.primary_client.generate(prompt, **constraints)
-            except Exception as e:
-                print(f"--- RelevanceChecker: Gemini Failed: {e} ---")
-                logger.warning(f"Gemini failed ({e}). Switching to fallback...")
-        else:
-            print("--- RelevanceChecker: GeminiClient is NONE (Initialization failed) ---")
-        
-        # 2. Try Secondary (OpenAI)
-        if self.secondary_client:
-            print("--- RelevanceChecker: Attempting OpenAI Fallback ---")
-            try:
-                return self.secondary_client.generate(prompt, **constraints)
-            except Exception as e:
-                print(f"--- RelevanceChecker: OpenAI Failed: {e} ---")
-                logger.error(f"OpenAI failed: {e}")
-        
-        # 3. Fail
-        raise RuntimeError("All models failed to generate a response.")
-
-    def check(self, question: str, retriever, k=3) -> str:
+        # Gemini first; OpenAI is hedged in if Gemini is slow, or used directly if it fails.
+        # Responses are streamed and cut off as soon as the label is readable.
+        try:
+            return await hedged_generate(
+                lambda client: self._stream_label(client, prompt, constraints),
+                self.primary_client,
+                self.secondary_client,
+                operation="relevance",
+                key=request_key(prompt, **constraints)
+            )
+        except Exception as e:
+            logger.error("All models failed: %s", e)
+            raise RuntimeError("All models failed to generate a response.") from e
+
+    def _local_classify(self, question_vector, passages, retriever):
         """
-        1. Retrieve top-k document chunks.
-        2. Combine them into a single string.
-        3. Classify relevance using Fuzzy Matching to handle token cutoffs.
+        Classify without an LLM from the mean cosine similarity between the question
+        and the passages. Passage vectors are read back from Chroma instead of being
+        re-embedded. Returns None (-> ask the LLM) when no vectors are available or
+        the score falls in the ambiguity band.
         """
-        logger.debug(f"RelevanceChecker.check called with question='{question}' and k={k}")
+        vector_store = _find_vector_store(retriever)
+        if question_vector is None or vector_store is None:
+            return None
 
-        # Retrieve doc chunks from the ensemble retriever
-        top_docs = retriever.invoke(question)
-        if not top_docs:
-            logger.debug("No documents returned from retriever.invoke(). Classifying as NO_MATCH.")
-            return "NO_MATCH"
-
-        # Combine the top k chunk texts into one string
-        document_content = "\n\n".join(doc.page_content for doc in top_docs[:k])
+        # The question's nearest chunks cover the vector half of the hybrid results;
+        # passages that only BM25 found have no vector here and are left out of the mean
+        try:
+            result = vector_store._collection.query(
+                query_embeddings=[question_vector.tolist()],
+                n_results=settings.VECTOR_SEARCH_K,
+                include=["embeddings", "documents"]
+            )
+        except Exception as e:
+            logger.warning("RelevanceChecker: Could not read passage vectors: %s", e)
+            return None
 
-        # Create the classification prompt
-        prompt = f"""
-        You are an AI relevance checker. 
-        Classify how well the document content addresses the user's question.
+        vectors_by_text = dict(zip(result["documents"][0], result["embeddings"][0]))
+        vectors = [vectors_by_text[doc.page_content] for doc in passages if doc.page_content in vectors_by_text]
+        if not vectors:
+            return None
 
-        **Instructions:**
-        - Respond with ONLY one label: CAN_ANSWER, PARTIAL, or NO_MATCH.
-        - Do not provide any explanation.
+        matrix = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(question_vector)
+        score = float(np.mean((matrix @ question_vector) / np.maximum(norms, 1e-12)))
 
-        **Labels:**
-        1) "CAN_ANSWER": The passages contain enough information to fully answer.
-        2) "PARTIAL": The passages discuss the topic but lack some details.
-        3) "NO_MATCH": The passages do not mention the topic at all.
+        low, high = settings.RELEVANCE_AMBIGUITY_BAND
+        if low <= score <= high:
+            logger.debug("Local relevance score %.3f is ambiguous; deferring to the LLM.", score)
+            return None
 
-        **Question:** {question}
-        **Passages:** {document_content}
+        if score > settings.RELEVANCE_CAN_ANSWER_THRESHOLD:
+            classification = "CAN_ANSWER"
+        elif score >= settings.RELEVANCE_PARTIAL_THRESHOLD:
+            classification = "PARTIAL"
+        else:
+            classification = "NO_MATCH"
+        logger.debug("Local relevance score %.3f -> %s", score, classification)
+        return classification
 
-        **Respond ONLY with one of the following labels: CAN_ANSWER, PARTIAL, NO_MATCH**
+    async def check(self, question: str, retriever, k=3) -> str:
         """
+        1. Retrieve top-k document chunks (overlapped with embedding the question).
+        2. Classify locally from question/passage similarity when the score is clear-cut.
+        3. Otherwise combine the chunks into a single string, compressed to the relevant sentences.
+        4. Classify relevance with the LLM, using Fuzzy Matching to handle token cutoffs.
+        """
+        logger.debug("RelevanceChecker.check called with question='%s' and k=%s", question, k)
+
+        # Retrieve doc chunks from the ensemble retriever while the question is embedded
+        top_docs, question_vector = await asyncio.gather(
+            retriever.ainvoke(question),
+            asyncio.to_thread(self.cache.embed, question)
+        )
+        if not top_docs:
+            logger.debug("No documents returned from retriever.ainvoke(). Classifying as NO_MATCH.")
+            return "NO_MATCH"
+
+        passages = top_docs[:k]
+
+        # Most questions are clear-cut: classify locally from embeddings and skip the LLM
+        classification = await asyncio.to_thread(self._local_classify, question_vector, passages, retriever)
+        if classification is not None:
+            return classification
+
+        # The semantic cache is scoped on the raw passages (the compressed text depends on the question)
+        scope = hashlib.sha256("\n\n".join(map(page_content, passages)).encode("utf-8")).hexdigest()
+
+        # Compress the top k chunk texts down to the sentences relevant to the question
+        document_content = await asyncio.to_thread(
+            compress_context, question, passages, settings.RELEVANCE_CONTEXT_TOKENS
+        )
+
+        # Create the classification prompt: byte-identical instructions first, variable payload last
+        prompt = _INSTRUCTIONS_PREFIX + (
+            f"**Question:** {question}\n"
+            f"**Passages:** {document_content}\n\n"
+            "**Respond ONLY with one of the following labels: CAN_ANSWER, PARTIAL, NO_MATCH**\n"
+        )
+
+        # --- CACHE LOOKUP ---
+        # Exact hit: identical prompt (question + passages). Safe because temperature is 0.
+        cache_key = self.cache.cache_key(prompt, temperature=0.0)
+        cached = await self.cache.aget(cache_key)
+        if cached:
+            logger.debug("Exact cache hit. Classification: %s", cached)
+            return cached
+
+        # Semantic hit: a near-duplicate question over the same passages
+        cached = self.cache.semantic_get(question_vector, scope)
+        if cached:
+            logger.debug("Semantic cache hit. Classification: %s", cached)
+            await self.cache.aset(cache_key, cached)
+            return cached
 
         try:
             # Get the raw string response
-            llm_response_text = self._get_llm_response(prompt)
+            llm_response_text = await self._get_llm_response(prompt)
         except RuntimeError:
             logger.error("All models failed. Defaulting to NO_MATCH.")
             return "NO_MATCH"
 
-        # Clean the response for processing
-        llm_response = llm_response_text.strip().upper()
-        print(f"Checker raw response: {llm_response}")
+        # Normalize case for matching (the regex doesn't care about surrounding whitespace)
+        llm_response = llm_response_text.upper()
+        logger.debug("Checker raw response: %s", llm_response)
 
         # --- RESILIENT FUZZY MATCHING ---
-        # Instead of '==' we use 'in' to handle cases where the model is cut off
+        # Instead of '==' we search for the first label to handle cases where the model is cut off
         # or adds extra reasoning (e.g., 'Label: PARTIAL' or 'PART' due to token limits).
-        if "CAN_ANSWER" in llm_response:
-            classification = "CAN_ANSWER"
-        elif "PART" in llm_response: 
-            # This catches "PART", "PARTIAL", "PARTIALLY", or "PART..."
-            classification = "PARTIAL"
-        elif "NO_MATCH" in llm_response:
-            classification = "NO_MATCH"
+        match = _LABEL_RE.search(llm_response)
+        if match:
+            classification = _LABELS[match.group(1)]
         else:
             # If the model returns something completely unexpected, default to NO_MATCH
-            logger.debug(f"Unexpected LLM output: {llm_response}. Forcing 'NO_MATCH'.")
+            logger.debug("Unexpected LLM output: %s. Forcing 'NO_MATCH'.", llm_response)
             classification = "NO_MATCH"
 
-        print(f"Final Classification: {classification}")
+        logger.debug("Final Classification: %s", classification)
+
+        await self.cache.aset(cache_key, classification)
+        self.cache.semantic_set(question_vector, scope, classification)
         return classification
\ No newline at end of file
@@ -1,8 +1,28 @@
-from providers import GeminiClient, OpenAIClient
-from typing import Dict, List
+from providers import get_gemini, get_openai, hedged_generate, request_key
+from typing import Callable, Dict, List, Optional
 from langchain_core.documents import Document
 from config.settings import settings
+from utils.compression import compress_context
+import asyncio
 import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Marker the model writes after its answer; used as a stop sequence so it never reaches the UI
+END_SENTINEL = "</end>"
+
+# Static part of the prompt. Kept first and identical across requests so providers can prefix-cache it.
+_INSTRUCTIONS_PREFIX = """You are an AI assistant designed to provide precise and factual answers based on the given context.
+
+**Instructions:**
+- Answer the following question using only the provided context.
+- Be clear, concise, and factual.
+- Return as much information as you can get from the context.
+- When your answer is complete, write </end> on its own line.
+
+---
+"""
 
 
 class ResearchAgent:
@@ -10,110 +30,155 @@ class ResearchAgent:
         """
         Initialize the research agent with Gemini (Primary) and OpenAI (Fallback).
         """
-        print("Initializing ResearchAgent...")
+        logger.debug("Initializing ResearchAgent...")
         
         # 1. Initialize Primary (Gemini)
         try:
             # Note: This uses the default config from your GeminiClient. 
             # If you strictly need temperature=0.3, you might need to update GeminiClient to accept config.
-            self.primary_client = GeminiClient(api_key=settings.GOOGLE_API_KEY)
-            print(" - Primary (Gemini) initialized.")
+            self.primary_client = get_gemini()
+            logger.info("ResearchAgent: Primary (Gemini) initialized.")
         except Exception as e:
-            print(f"Warning: Could not init Gemini: {e}")
+            logger.warning("ResearchAgent: Could not init Gemini: %s", e)
             self.primary_client = None
 
         # 2. Initialize Secondary (OpenAI)
         try:
-            self.secondary_client = OpenAIClient(api_key=settings.OPENAI_API_KEY)
-            print(" - Secondary (OpenAI) initialized.")
+            self.secondary_client = get_openai()
+            logger.info("ResearchAgent: Secondary (OpenAI) initialized.")
         except Exception as e:
-            print(f"Warning: Could not init OpenAI: {e}")
+            logger.warning("ResearchAgent: Could not init OpenAI: %s", e)
             self.secondary_client = None
 
     def sanitize_response(self, response_text: str) -> str:
         """
-        Sanitize the LLM's response by stripping unnecessary whitespace.
+        Sanitize the LLM's response by stripping unnecessary whitespace
+        (and the end marker, if a provider returned it instead of stopping on it).
         """
-        return response_text.strip()
+        return response_text.split(END_SENTINEL, 1)[0].strip()
 
     def generate_prompt(self, question: str, context: str) -> str:
         """
         Generate a structured prompt for the LLM to generate a precise and factual answer.
         """
-        prompt = f"""
-        You are an AI assistant designed to provide precise and factual answers based on the given context.
-
-        **Instructions:**
-        - Answer the following question using only the provided context.
-        - Be clear, concise, and factual.
-        - Return as much information as you can get from the context.
-        
-        **Question:** {question}
-        **Context:**
-        {context}
-
-        **Provide your answer below:**
-        """
+        prompt = _INSTRUCTIONS_PREFIX + (
+            f"**Question:** {question}\n"
+            f"**Context:**\n{context}\n\n"
+            "**Provide your answer below:**\n"
+        )
         return prompt
     
 
-    def _get_llm_response(self, prompt: str) -> str:
+    async def _cache_context(self, context: str) -> Optional[str]:
+        """
+        Upload the context to Gemini's context cache so the verification call can reuse it.
+        Returns the cache name, or None if caching is off, unavailable or not worth it.
+        Never raises, so it can run as a background task.
+        """
+        if not settings.GEMINI_CONTEXT_CACHE or self.primary_client is None:
+            return None
+        try:
+            return await asyncio.to_thread(
+                self.primary_client.cache_context,
+                context,
+                settings.GEMINI_CONTEXT_CACHE_TTL,
+                settings.GEMINI_CONTEXT_CACHE_MIN_TOKENS
+            )
+        except Exception as e:
+            logger.warning("ResearchAgent: Context caching failed, verification will send the full prompt: %s", e)
+            return None
+
+    async def _get_llm_response(
+        self,
+        prompt: str,
+        on_token: Optional[Callable[[str], None]] = None
+    ) -> str:
         """
         Refined 2026 fallback logic with rate-limit awareness.
+        Gemini first (better free tier limits); OpenAI is hedged in if Gemini is slow.
+        With `on_token`, the answer is streamed and `on_token` gets the text so far after every chunk.
         """
         constraints = {
             "max_tokens": 4000, # Keep responses concise to save tokens
-            "temperature": 0.3
+            "temperature": 0.3,
+            "stop": [END_SENTINEL]  # Stop as soon as the model marks its answer complete
         }
 
-        # 1. ALWAYS try Gemini first (Better free tier limits)
-        if self.primary_client:
-            try:
-                print("Attempting research with Gemini...")
-                return self.primary_client.generate(prompt, **constraints)
-            except Exception as e:
-                print(f"Gemini (Primary) unavailable: {e}")
-        
-        # 2. Try OpenAI second (The 'Safety Net')
-        if self.secondary_client:
+        async def call(client):
+            return await client.agenerate(prompt, **constraints)
+
+        def stream_call(client, attempt):
+            # Each attempt restarts from an empty buffer, so a failover replaces (not appends to) the text shown
+            stream = client.generate_stream(prompt, **constraints)
+            text = ""
             try:
-                print("Attempting fallback with OpenAI...")
-                return self.secondary_client.generate(prompt, **constraints)
-            except Exception as e:
-                # If OpenAI also fails with a 429, we give a specific error
-                if "429" in str(e):
-                    raise RuntimeError("Rate limit reached. Please wait 60 seconds.") from e
-                print(f"OpenAI (Fallback) failed: {e}")
-
-        raise RuntimeError("No AI models are currently responding. Check your API keys.")
+                for chunk in stream:
+                    text += chunk
+                    # Abandoned (timed out or failed over): stop reading and close the stream
+                    if not attempt.emit(text):
+                        break
+            finally:
+                stream.close()
+            return text
+
+        try:
+            return await hedged_generate(
+                stream_call if on_token else call,
+                self.primary_client,
+                self.secondary_client,
+                operation="research",
+                key=request_key(prompt, **constraints),
+                on_token=on_token
+            )
+        except Exception as e:
+            # If the last model also failed with a 429, we give a specific error
+            if "429" in str(e):
+                raise RuntimeError("Rate limit reached. Please wait 60 seconds.") from e
+            raise RuntimeError("No AI models are currently responding. Check your API keys.") from e
     
 
-    def generate(self, question: str, documents: List[Document]) -> Dict:
+    async def generate(
+        self,
+        question: str,
+        documents: List[Document],
+        on_token: Optional[Callable[[str], None]] = None
+    ) -> Dict:
         """
         Generate an initial answer using the provided documents.
+        Pass `on_token` to receive the partial answer as it is generated.
         """
-        print(f"ResearchAgent.generate called for: '{question}'")
+        logger.debug("ResearchAgent.generate called for: '%s'", question)
 
-        # 1. Combine the document contents into one context string
-        context = "\n\n".join([doc.page_content for doc in documents])
+        # 1. Combine the document contents into one context string, compressed to the sentences relevant to the question
+        context = await asyncio.to_thread(
+            compress_context, question, documents, settings.ANSWER_CONTEXT_TOKENS
+        )
         
-        # 2. Create the prompt
+        # 2. Create the prompt. The context is uploaded to Gemini's context cache in the background
+        # for the verification call; research sends the full prompt, so the upload runs alongside it.
         prompt = self.generate_prompt(question, context)
+        cache_task = asyncio.create_task(self._cache_context(context))
 
         # 3. Call the LLM using our helper (Gemini -> OpenAI fallback)
         try:
-            print("Sending prompt to the model...")
+            logger.debug("Sending prompt to the model...")
             # We call our helper which returns a raw string
-            raw_answer = self._get_llm_response(prompt)
-            print("LLM response received.")
+            raw_answer = await self._get_llm_response(prompt, on_token)
+            logger.debug("LLM response received.")
+            # The upload has usually finished while the answer was generated
+            context_cache = await cache_task
         except Exception as e:
-            print(f"Error during model inference: {e}")
+            logger.error("Error during model inference: %s", e)
             raise RuntimeError("Failed to generate answer due to a model error.") from e
+        finally:
+            # No verification follows a failed (or cancelled) answer, so don't wait on a cache for it
+            cache_task.cancel()
 
         # 4. Sanitize and return
         draft_answer = self.sanitize_response(raw_answer) if raw_answer else "I cannot answer this question."
 
         return {
             "draft_answer": draft_answer,
-            "context_used": context
+            "context_used": context,
+            "context_cache": context_cache
         }
\ No newline at end of file
@@ -1,8 +1,65 @@
 import json  # Import for JSON serialization
-from providers import GeminiClient, OpenAIClient
-from typing import Dict, List
+from providers import GeminiClient, get_gemini, get_openai, hedged_generate, request_key
+from typing import Dict, List, Optional
 from langchain_core.documents import Document
 from config.settings import settings
+from utils.compression import compress_context
+import asyncio
+import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+# One multi-line scan extracts every "Field: value" line. Tolerates markdown bullets/bold around the key.
+_FIELD_RE = re.compile(
+    r"^[ \t*#-]*(Supported|Unsupported Claims|Contradictions|Relevant|Additional Details)[ \t*]*:[ \t*]*(.*?)[ \t\r]*$",
+    re.MULTILINE | re.IGNORECASE
+)
+# Items of an "[a, 'b', c]" list, without surrounding whitespace or quotes
+_LIST_RE = re.compile(r"""[^,\[\]\s'"](?:[^,\[\]]*[^,\[\]\s'"])?""")
+# Lowercased key as written by the model -> canonical report key
+_KEY_MAP = {
+    "supported": "Supported",
+    "unsupported claims": "Unsupported Claims",
+    "contradictions": "Contradictions",
+    "relevant": "Relevant",
+    "additional details": "Additional Details"
+}
+_LIST_FIELDS = {"Unsupported Claims", "Contradictions"}
+
+# Static part of the prompt. Kept first and identical across requests so providers can prefix-cache it.
+_INSTRUCTIONS_PREFIX = """You are an AI assistant designed to verify the accuracy and relevance of answers based on provided context.
+
+**Instructions:**
+- Verify the following answer against the provided context.
+- Check for:
+1. Direct/indirect factual support (YES/NO)
+2. Unsupported claims (list any if present)
+3. Contradictions (list any if present)
+4. Relevance to the question (YES/NO)
+- Provide additional details or explanations where relevant.
+- Respond in the exact format specified below without adding any unrelated information.
+
+**Format:**
+Supported: YES/NO
+Unsupported Claims: [item1, item2, ...]
+Contradictions: [item1, item2, ...]
+Relevant: YES/NO
+Additional Details: [Any extra information or explanations]
+
+---
+"""
+
+
+def _default_verification(additional_details: str = "") -> Dict:
+    """A report with every key present and nothing verified."""
+    return {
+        "Supported": "NO",
+        "Unsupported Claims": [],
+        "Contradictions": [],
+        "Relevant": "NO",
+        "Additional Details": additional_details
+    }
 
 
 class VerificationAgent:
@@ -10,60 +67,33 @@ class VerificationAgent:
         """
         Initialize the verification agent with Gemini (Primary) and OpenAI (Fallback).
         """
-        print("Initializing VerificationAgent...")
+        logger.debug("Initializing VerificationAgent...")
         
         # 1. Initialize Primary (Gemini)
         try:
-            self.primary_client = GeminiClient(api_key=settings.GOOGLE_API_KEY)
-            print(" - Primary (Gemini) initialized.")
+            self.primary_client = get_gemini()
+            logger.info("VerificationAgent: Primary (Gemini) initialized.")
         except Exception as e:
-            print(f"Warning: Could not init Gemini: {e}")
+            logger.warning("VerificationAgent: Could not init Gemini: %s", e)
             self.primary_client = None
 
         # 2. Initialize Secondary (OpenAI)
         try:
-            self.secondary_client = OpenAIClient(api_key=settings.OPENAI_API_KEY)
-            print(" - Secondary (OpenAI) initialized.")
+            self.secondary_client = get_openai()
+            logger.info("VerificationAgent: Secondary (OpenAI) initialized.")
         except Exception as e:
-            print(f"Warning: Could not init OpenAI: {e}")
+            logger.warning("VerificationAgent: Could not init OpenAI: %s", e)
             self.secondary_client = None
 
-    def sanitize_response(self, response_text: str) -> str:
-        """
-        Sanitize the LLM's response by stripping unnecessary whitespace.
-        """
-        return response_text.strip()
-
     def generate_prompt(self, answer: str, context: str) -> str:
         """
         Generate a structured prompt for the LLM to verify the answer against the context.
         """
-        prompt = f"""
-        You are an AI assistant designed to verify the accuracy and relevance of answers based on provided context.
-
-        **Instructions:**
-        - Verify the following answer against the provided context.
-        - Check for:
-        1. Direct/indirect factual support (YES/NO)
-        2. Unsupported claims (list any if present)
-        3. Contradictions (list any if present)
-        4. Relevance to the question (YES/NO)
-        - Provide additional details or explanations where relevant.
-        - Respond in the exact format specified below without adding any unrelated information.
-
-        **Format:**
-        Supported: YES/NO
-        Unsupported Claims: [item1, item2, ...]
-        Contradictions: [item1, item2, ...]
-        Relevant: YES/NO
-        Additional Details: [Any extra information or explanations]
-
-        **Answer:** {answer}
-        **Context:**
-        {context}
-
-        **Respond ONLY with the above format.**
-        """
+        prompt = _INSTRUCTIONS_PREFIX + (
+            f"**Answer:** {answer}\n"
+            f"**Context:**\n{context}\n\n"
+            "**Respond ONLY with the above format.**\n"
+        )
         return prompt
 
     def parse_verification_response(self, response_text: str) -> Dict:
@@ -71,40 +101,25 @@ class VerificationAgent:
         Parse the LLM's verification response into a structured dictionary.
         """
         try:
-            lines = response_text.split('\n')
-            verification = {}
-            for line in lines:
-                if ':' in line:
-                    key, value = line.split(':', 1)
-                    key = key.strip().capitalize()
-                    value = value.strip()
-                    if key in {"Supported", "Unsupported claims", "Contradictions", "Relevant", "Additional details"}:
-                        if key in {"Unsupported claims", "Contradictions"}:
-                            # Convert string list to actual list
-                            if value.startswith('[') and value.endswith(']'):
-                                items = value[1:-1].split(',')
-                                # Remove any surrounding quotes and whitespace
-                                items = [item.strip().strip('"').strip("'") for item in items if item.strip()]
-                                verification[key] = items
-                            else:
-                                verification[key] = []
-                        elif key == "Additional details":
-                            verification[key] = value
-                        else:
-                            verification[key] = value.upper()
-            # Ensure all keys are present
-            for key in ["Supported", "Unsupported Claims", "Contradictions", "Relevant", "Additional Details"]:
-                if key not in verification:
-                    if key in {"Unsupported Claims", "Contradictions"}:
-                        verification[key] = []
-                    elif key == "Additional Details":
-                        verification[key] = ""
-                    else:
-                        verification[key] = "NO"
+            # Start from the defaults so every key is present, then fill in what the model returned
+            verification = _default_verification()
+            for match in _FIELD_RE.finditer(response_text):
+                key = _KEY_MAP.get(match.group(1).lower())
+                if key is None:
+                    continue
+                value = match.group(2)
+                if key in _LIST_FIELDS:
+                    # Convert string list to actual list
+                    if value.startswith('[') and value.endswith(']'):
+                        verification[key] = _LIST_RE.findall(value)
+                elif key == "Additional Details":
+                    verification[key] = value
+                else:
+                    verification[key] = value.upper()
 
             return verification
         except Exception as e:
-            print(f"Error parsing verification response: {e}")
+            logger.error("Error parsing verification response: %s", e)
             return None
 
     def format_verification_report(self, verification: Dict) -> str:
@@ -117,110 +132,103 @@ class VerificationAgent:
         relevant = verification.get("Relevant", "NO")
         additional_details = verification.get("Additional Details", "")
 
-        report = f"**Supported:** {supported}\n"
-        if unsupported_claims:
-            report += f"**Unsupported Claims:** {', '.join(unsupported_claims)}\n"
-        else:
-            report += f"**Unsupported Claims:** None\n"
-
-        if contradictions:
-            report += f"**Contradictions:** {', '.join(contradictions)}\n"
-        else:
-            report += f"**Contradictions:** None\n"
-
-        report += f"**Relevant:** {relevant}\n"
-
-        if additional_details:
-            report += f"**Additional Details:** {additional_details}\n"
-        else:
-            report += f"**Additional Details:** None\n"
-
-        return report
+        parts = [
+            f"**Supported:** {supported}",
+            f"**Unsupported Claims:** {', '.join(unsupported_claims) or 'None'}",
+            f"**Contradictions:** {', '.join(contradictions) or 'None'}",
+            f"**Relevant:** {relevant}",
+            f"**Additional Details:** {additional_details or 'None'}"
+        ]
+        return "\n".join(parts) + "\n"
     
 
-    def _get_llm_response(self, prompt: str) -> str:
+    async def _get_llm_response(self, prompt: str, cached_prompt: Optional[str] = None, context_cache: Optional[str] = None) -> str:
         """
         Refined 2026 fallback logic with rate-limit awareness.
+        Gemini first (better free tier limits); OpenAI is hedged in if Gemini is slow.
+        With a `context_cache`, Gemini gets `cached_prompt` (context left out) instead of `prompt`.
         """
+        # Thinking tokens count against max_tokens, so thinking is switched off:
+        # otherwise it could use up the budget before the report is written.
         constraints = {
-            "max_tokens": 3000, # Keep responses concise to save tokens
-            "temperature": 0.0
+            "max_tokens": 512, # The 5-field report rarely exceeds ~300 tokens
+            "temperature": 0.0,
+            "thinking_budget": 0
         }
 
-        # 1. ALWAYS try Gemini first (Better free tier limits)
-        if self.primary_client:
-            try:
-                print("Attempting research with Gemini...")
-                return self.primary_client.generate(prompt, **constraints)
-            except Exception as e:
-                print(f"Gemini (Primary) unavailable: {e}")
-        
-        # 2. Try OpenAI second (The 'Safety Net')
-        if self.secondary_client:
-            try:
-                print("Attempting fallback with OpenAI...")
-                return self.secondary_client.generate(prompt, **constraints)
-            except Exception as e:
-                # If OpenAI also fails with a 429, we give a specific error
-                if "429" in str(e):
-                    raise RuntimeError("Rate limit reached. Please wait 60 seconds.") from e
-                print(f"OpenAI (Fallback) failed: {e}")
-
-        raise RuntimeError("No AI models are currently responding. Check your API keys.")
+        async def call(client):
+            if context_cache and client.name == GeminiClient.name:
+                return await client.agenerate(cached_prompt, cached_content=context_cache, **constraints)
+            return await client.agenerate(prompt, **constraints)
+
+        try:
+            return await hedged_generate(
+                call,
+                self.primary_client,
+                self.secondary_client,
+                operation="verification",
+                key=request_key(prompt, **constraints)
+            )
+        except Exception as e:
+            # If the last model also failed with a 429, we give a specific error
+            if "429" in str(e):
+                raise RuntimeError("Rate limit reached. Please wait 60 seconds.") from e
+            raise RuntimeError("No AI models are currently responding. Check your API keys.") from e
     
 
-    def check(self, answer: str, documents: List[Document]) -> Dict:
+    async def check(
+        self,
+        answer: str,
+        documents: List[Document],
+        context: Optional[str] = None,
+        context_cache: Optional[str] = None
+    ) -> Dict:
         """
         Verify the answer against the provided documents.
+        Pass `context` (e.g. the ResearchAgent's `context_used`) to verify against
+        exactly what the answer was drafted from and skip rebuilding it.
+        Pass `context_cache` (the ResearchAgent's `context_cache`) if that context is
+        already in Gemini's context cache.
         """
-        print(f"VerificationAgent.check called with answer and {len(documents)} documents.")
+        logger.debug("VerificationAgent.check called with answer and %d documents.", len(documents))
 
-        # Combine all document contents into one string
-        context = "\n\n".join([doc.page_content for doc in documents])
-        print(f"Combined context length: {len(context)} characters.")
+        # Combine all document contents into one string, compressed to the sentences relevant to the answer
+        if context is None:
+            context = await asyncio.to_thread(
+                compress_context, answer, documents, settings.ANSWER_CONTEXT_TOKENS
+            )
+        logger.debug("Combined context length: %d characters.", len(context))
 
         # Create a prompt for the LLM to verify the answer
         prompt = self.generate_prompt(answer, context)
-        print("Prompt created for the LLM.")
+        cached_prompt = self.generate_prompt(answer, GeminiClient.CACHED_CONTEXT_NOTE) if context_cache else None
+        logger.debug("Prompt created for the LLM.")
 
         # 1. FIX: Call the helper instead of self.model.chat
         try:
-            print("Sending verification prompt to the model...")
-            llm_response = self._get_llm_response(prompt) # Returns raw string
-            print("LLM response received.")
+            logger.debug("Sending verification prompt to the model...")
+            llm_response = await self._get_llm_response(prompt, cached_prompt, context_cache) # Returns raw string
+            logger.debug("LLM response received.")
         except Exception as e:
-            print(f"Error during model inference: {e}")
+            logger.error("Error during model inference: %s", e)
             raise RuntimeError("Failed to verify answer due to a model error.") from e
 
         # 2. Extract and process the LLM's response
-        # Since _get_llm_response already gives us the content string, we just sanitize it
-        sanitized_response = self.sanitize_response(llm_response) if llm_response else ""
-
-        if not sanitized_response:
-            print("LLM returned an empty response.")
-            verification_report = {
-                "Supported": "NO",
-                "Unsupported Claims": [],
-                "Contradictions": [],
-                "Relevant": "NO",
-                "Additional Details": "Empty response from the model."
-            }
+        # The field regex is line-anchored and skips surrounding whitespace, so the raw
+        # string is parsed directly without a separate strip() copy
+        if not llm_response or llm_response.isspace():
+            logger.warning("LLM returned an empty response.")
+            verification_report = _default_verification("Empty response from the model.")
         else:
             # 3. Parse the response using your existing parser
-            verification_report = self.parse_verification_response(sanitized_response)
+            verification_report = self.parse_verification_response(llm_response)
             if verification_report is None:
-                print("LLM did not respond with expected format. Using default.")
-                verification_report = {
-                    "Supported": "NO",
-                    "Unsupported Claims": [],
-                    "Contradictions": [],
-                    "Relevant": "NO",
-                    "Additional Details": "Failed to parse the model's response."
-                }
+                logger.warning("LLM did not respond with expected format. Using default.")
+                verification_report = _default_verification("Failed to parse the model's response.")
 
         # 4. Format the final report for the UI
         verification_report_formatted = self.format_verification_report(verification_report)
-        print(f"Verification report completed.")
+        logger.debug("Verification report completed.")
 
         return {
             "verification_report": verification_report_formatted,
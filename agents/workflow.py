@@ -1,11 +1,15 @@
 from langgraph.graph import StateGraph, END
-from typing import TypedDict, List, Dict
+from typing import TypedDict, List, Dict, Iterator, Optional
 from .research_agent import ResearchAgent
 from .verification_agent import VerificationAgent
 from .relevance_checker import RelevanceChecker
 from langchain_core.documents import Document
+from langchain_core.runnables import RunnableConfig
 from langchain_classic.retrievers import EnsembleRetriever
+from utils.aio import get_loop, run_sync
+import asyncio
 import logging
+import queue
 
 logger = logging.getLogger(__name__)
 
@@ -13,6 +17,8 @@ class AgentState(TypedDict):
     question: str
     documents: List[Document]
     draft_answer: str
+    context: str  # Context the draft answer was generated from
+    context_cache: Optional[str]  # Gemini cached-content name holding that context, if any
     verification_report: str
     is_relevant: bool
     retriever: EnsembleRetriever
@@ -54,9 +60,9 @@ class AgentWorkflow:
         )
         return workflow.compile()
     
-    def _check_relevance_step(self, state: AgentState) -> Dict:
+    async def _check_relevance_step(self, state: AgentState) -> Dict:
         retriever = state["retriever"]
-        classification = self.relevance_checker.check(
+        classification = await self.relevance_checker.check(
             question=state["question"], 
             retriever=retriever, 
             k=20
@@ -81,19 +87,47 @@ class AgentWorkflow:
 
     def _decide_after_relevance_check(self, state: AgentState) -> str:
         decision = "relevant" if state["is_relevant"] else "irrelevant"
-        print(f"[DEBUG] _decide_after_relevance_check -> {decision}")
+        logger.debug("_decide_after_relevance_check -> %s", decision)
         return decision
     
     def full_pipeline(self, question: str, retriever: EnsembleRetriever, config: Dict = None):
+        """Synchronous entry point for the UI. Runs the async pipeline on the shared event loop."""
+        return run_sync(self.afull_pipeline(question, retriever, config))
+
+    def stream_pipeline(self, question: str, retriever: EnsembleRetriever, config: Dict = None) -> Iterator[Dict]:
+        """
+        Like full_pipeline, but yields {"draft_answer", "verification_report"} while the answer
+        is being generated (with an empty report), then the final result.
+        """
+        updates = queue.Queue()
+        config = dict(config or {})
+        config["configurable"] = {**config.get("configurable", {}), "on_token": updates.put}
+
+        future = asyncio.run_coroutine_threadsafe(self.afull_pipeline(question, retriever, config), get_loop())
+        future.add_done_callback(lambda _: updates.put(None))
+
+        while True:
+            partial = updates.get()
+            # Skip to the newest text if the UI fell behind
+            while partial is not None and not updates.empty():
+                partial = updates.get_nowait()
+            if partial is None:
+                break
+            yield {"draft_answer": partial, "verification_report": ""}
+        yield future.result()
+
+    async def afull_pipeline(self, question: str, retriever: EnsembleRetriever, config: Dict = None):
         try:
-            print(f"[DEBUG] Starting full_pipeline with question='{question}'")
-            documents = retriever.invoke(question)
-            logger.info(f"Retrieved {len(documents)} relevant documents (from .invoke)")
+            logger.debug("Starting full_pipeline with question='%s'", question)
+            documents = await retriever.ainvoke(question)
+            logger.info("Retrieved %d relevant documents (from .ainvoke)", len(documents))
 
             initial_state = AgentState(
                 question=question,
                 documents=documents,
                 draft_answer="",
+                context="",
+                context_cache=None,
                 verification_report="",
                 is_relevant=False,
                 retriever=retriever
@@ -101,34 +135,46 @@ class AgentWorkflow:
             
             # Pass the config to the compiled workflow's invoke method
             # If config is None, LangGraph uses its defaults
-            final_state = self.compiled_workflow.invoke(initial_state, config=config)
+            final_state = await self.compiled_workflow.ainvoke(initial_state, config=config)
             
             return {
                 "draft_answer": final_state["draft_answer"],
                 "verification_report": final_state["verification_report"]
             }
         except Exception as e:
-            logger.error(f"Workflow execution failed: {e}")
+            logger.error("Workflow execution failed: %s", e)
             raise
     
-    def _research_step(self, state: AgentState) -> Dict:
-        print(f"[DEBUG] Entered _research_step with question='{state['question']}'")
-        result = self.researcher.generate(state["question"], state["documents"])
-        print("[DEBUG] Researcher returned draft answer.")
-        return {"draft_answer": result["draft_answer"]}
+    async def _research_step(self, state: AgentState, config: RunnableConfig) -> Dict:
+        logger.debug("Entered _research_step with question='%s'", state["question"])
+        # stream_pipeline passes a callback for the partial answer
+        on_token = config.get("configurable", {}).get("on_token")
+        result = await self.researcher.generate(state["question"], state["documents"], on_token=on_token)
+        logger.debug("Researcher returned draft answer.")
+        return {
+            "draft_answer": result["draft_answer"],
+            "context": result["context_used"],
+            "context_cache": result["context_cache"]
+        }
     
-    def _verification_step(self, state: AgentState) -> Dict:
-        print("[DEBUG] Entered _verification_step. Verifying the draft answer...")
-        result = self.verifier.check(state["draft_answer"], state["documents"])
-        print("[DEBUG] VerificationAgent returned a verification report.")
+    async def _verification_step(self, state: AgentState) -> Dict:
+        logger.debug("Entered _verification_step. Verifying the draft answer...")
+        # Reuse the researcher's context instead of rebuilding it from the documents
+        result = await self.verifier.check(
+            state["draft_answer"],
+            state["documents"],
+            context=state.get("context") or None,
+            context_cache=state.get("context_cache")
+        )
+        logger.debug("VerificationAgent returned a verification report.")
         return {"verification_report": result["verification_report"]}
     
     def _decide_next_step(self, state: AgentState) -> str:
         verification_report = state["verification_report"]
-        print(f"[DEBUG] _decide_next_step with verification_report='{verification_report}'")
+        logger.debug("_decide_next_step with verification_report='%s'", verification_report)
         if "Supported: NO" in verification_report or "Relevant: NO" in verification_report:
-            logger.info("[DEBUG] Verification indicates re-research needed.")
+            logger.info("Verification indicates re-research needed.")
             return "re_research"
         else:
-            logger.info("[DEBUG] Verification successful, ending workflow.")
+            logger.info("Verification successful, ending workflow.")
             return "end"
@@ -36,7 +36,39 @@ class Settings(BaseSettings):
 
     # Retrieval settings
     VECTOR_SEARCH_K: int = 10
-    HYBRID_RETRIEVER_WEIGHTS: list = [0.4, 0.6]
+    HYBRID_FUSION: str = "dbsf"  # "dbsf" (score fusion) or "rrf" (rank fusion)
+    HYBRID_RETRIEVER_WEIGHTS: list = [0.4, 0.6]  # BM25, vector (RRF)
+    DBSF_WEIGHTS: list = [0.7, 0.3]  # BM25, vector (DBSF)
+
+    # Prompt compression budgets (tokens of context sent to the LLM)
+    RELEVANCE_CONTEXT_TOKENS: int = 800
+    ANSWER_CONTEXT_TOKENS: int = 3000  # Research and verification
+
+    # Local relevance classifier (mean question/passage cosine similarity)
+    RELEVANCE_CAN_ANSWER_THRESHOLD: float = 0.78
+    RELEVANCE_PARTIAL_THRESHOLD: float = 0.55
+    RELEVANCE_AMBIGUITY_BAND: list = [0.50, 0.60]  # Scores in here are sent to the LLM instead
+
+    # LLM routing settings
+    HEDGE_DELAY_SECONDS: float = 5.0  # Start the fallback model if the primary hasn't answered by then
+    CIRCUIT_BREAKER_THRESHOLD: int = 3  # Consecutive failures before a provider is skipped
+    CIRCUIT_BREAKER_COOLDOWN: float = 60.0
+    HEALTH_PROBE_INTERVAL: float = 10.0
+    LLM_LATENCY_WINDOW: int = 200  # Calls kept per provider/operation for the p99 timeout
+    LLM_TIMEOUT_HEADROOM: float = 1.3
+    LLM_TIMEOUT_FLOOR: float = 2.0
+    LLM_TIMEOUT_CEILING: float = 15.0  # Operations not listed below
+    LLM_TIMEOUT_CEILINGS: dict = {
+        "verification": 45.0,
+        "research": 120.0,
+        # Streamed research is only bounded until its first chunk, which Gemini sends after it finishes thinking
+        "research:first_chunk": 60.0
+    }  # Per operation (long outputs)
+
+    # Gemini context caching (research + verification share the same context)
+    GEMINI_CONTEXT_CACHE: bool = True
+    GEMINI_CONTEXT_CACHE_TTL: int = 600  # Seconds
+    GEMINI_CONTEXT_CACHE_MIN_TOKENS: int = 1024  # The API rejects smaller caches
 
     # Logging settings
     LOG_LEVEL: str = "INFO"
@@ -45,6 +77,10 @@ class Settings(BaseSettings):
     CACHE_DIR: str = "document_cache"
     CACHE_EXPIRE_DAYS: int = 7
 
+    # LLM response cache settings
+    REDIS_URL: Optional[str] = None
+    SEMANTIC_CACHE_THRESHOLD: float = 0.95
+
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
@@ -0,0 +1,30 @@
+from docling.datamodel.base_models import InputFormat
+from docling.document_converter import DocumentConverter, PdfFormatOption
+from docling.datamodel.pipeline_options import PdfPipelineOptions, RapidOcrOptions
+from docling.backend.pypdfium2_backend import PyPdfiumDocumentBackend
+
+
+def convert_to_markdown(path: str) -> str:
+    """
+    Convert a document to Markdown with Docling.
+
+    Only depends on Docling, so it can run in a separate (e.g. GPU) container.
+    The layout model and TableFormer run on PyTorch and use CUDA when available.
+    """
+    pipeline_options = PdfPipelineOptions()
+    pipeline_options.do_ocr = True #Change this to false if I want to bypass ocr for digital pdf's (selectable text)
+    pipeline_options.ocr_options = RapidOcrOptions(force_full_page_ocr=False)
+    pipeline_options.do_table_structure = True
+
+    # THE CORRECT FIX: Use PdfFormatOption instead of a raw dictionary
+    converter = DocumentConverter(
+        format_options={
+            InputFormat.PDF: PdfFormatOption(
+                pipeline_options=pipeline_options,
+                backend=PyPdfiumDocumentBackend
+            )
+        }
+    )
+
+    result = converter.convert(path)
+    return result.document.export_to_markdown()
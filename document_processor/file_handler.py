@@ -3,21 +3,27 @@ import hashlib
 import pickle
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import List
-from docling.document_converter import DocumentConverter
+from typing import Callable, List
 from langchain_text_splitters import MarkdownHeaderTextSplitter
 from config import constants
 from config.settings import settings
 from utils.logging import logger
-from docling.datamodel.base_models import InputFormat
-from docling.document_converter import PdfFormatOption
-from docling.datamodel.pipeline_options import PdfPipelineOptions, RapidOcrOptions
-from docling.backend.pypdfium2_backend import PyPdfiumDocumentBackend
+
+
+def _convert_locally(path: str) -> str:
+    # Imported on first use, so processes that convert elsewhere don't need Docling installed
+    from .conversion import convert_to_markdown
+    return convert_to_markdown(path)
 
 
 class DocumentProcessor:
-    def __init__(self):
+    def __init__(self, convert: Callable[[str], str] = _convert_locally):
+        """
+        `convert` turns a file path into Markdown. Defaults to Docling in this process;
+        the Modal app passes one that runs Docling in a GPU container.
+        """
         self.headers = [("#", "Header 1"), ("##", "Header 2")]
+        self.convert = convert
         self.cache_dir = Path(settings.CACHE_DIR)
         self.cache_dir.mkdir(parents=True, exist_ok=True)
         
@@ -78,23 +84,7 @@ class DocumentProcessor:
         if not file.name.endswith(('.pdf', '.docx', '.txt', '.md')):
             return []
 
-        pipeline_options = PdfPipelineOptions()
-        pipeline_options.do_ocr = True #Change this to false if I want to bypass ocr for digital pdf's (selectable text)
-        pipeline_options.ocr_options = RapidOcrOptions(force_full_page_ocr=False)
-        pipeline_options.do_table_structure = True
-
-        # THE CORRECT FIX: Use PdfFormatOption instead of a raw dictionary
-        converter = DocumentConverter(
-            format_options={
-                InputFormat.PDF: PdfFormatOption(
-                    pipeline_options=pipeline_options,
-                    backend=PyPdfiumDocumentBackend
-                )
-            }
-        )
-
-        result = converter.convert(file.name)
-        markdown = result.document.export_to_markdown()
+        markdown = self.convert(file.name)
         
         splitter = MarkdownHeaderTextSplitter(self.headers)
         return splitter.split_text(markdown)
@@ -1,3 +1,4 @@
 from .builder import RetrieverBuilder
+from .fusion import DBSFRetriever
 
-__all__ = ["RetrieverBuilder"]
\ No newline at end of file
+__all__ = ["RetrieverBuilder", "DBSFRetriever"]
\ No newline at end of file
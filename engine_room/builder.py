@@ -1,13 +1,28 @@
+import hashlib
 import logging
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
 # We use the direct path to avoid the folder-naming confusion
 from langchain_classic.retrievers import EnsembleRetriever
 from langchain_community.vectorstores import Chroma
 from langchain_community.retrievers import BM25Retriever
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from config.settings import settings
+from providers import get_embeddings
+from utils.compression import page_content
+from .fusion import DBSFRetriever
 
 logger = logging.getLogger(__name__)
 
+# Number of BM25 indexes kept in memory (one per distinct chunk set)
+BM25_CACHE_SIZE = 16
+
+# Texts per embedding request (the Gemini batch endpoint accepts up to 100)
+EMBED_BATCH_SIZE = 100
+
 class RetrieverBuilder:
     def __init__(self):
         """
@@ -20,34 +35,166 @@ class RetrieverBuilder:
             logger.error("GOOGLE_API_KEY is missing in settings!")
             raise ValueError("GOOGLE_API_KEY is required for RetrieverBuilder")
 
-        # Using the latest Gemini embedding model
-        self.embeddings = GoogleGenerativeAIEmbeddings(
-            model="models/text-embedding-004",
-            google_api_key=settings.GOOGLE_API_KEY
-        )
+        # Using the latest Gemini embedding model (shared with the agents' semantic cache)
+        self.embeddings = get_embeddings()
         logger.info("Gemini Embeddings initialized successfully.")
+
+        self._bm25_cache: Dict[str, BM25Retriever] = {}
+        self._bm25_cache_lock = threading.Lock()
+
+        # One lock per chunk set: concurrent builds of the same set (e.g. a user loading an
+        # example while it is being prebuilt) wait for each other instead of both embedding it,
+        # or one deleting the collection the other is still filling
+        self._build_locks: Dict[str, threading.Lock] = {}
+        self._build_locks_guard = threading.Lock()
+
+    def _build_lock(self, fingerprint: str) -> threading.Lock:
+        with self._build_locks_guard:
+            return self._build_locks.setdefault(fingerprint, threading.Lock())
+
+    def _fingerprint(self, docs) -> str:
+        """Order-independent content fingerprint of a chunk set."""
+        contents = sorted(d.page_content.encode("utf-8") for d in docs)
+        return hashlib.blake2b(b"\x00".join(contents), digest_size=16).hexdigest()
+
+    def _vectors_path(self, fingerprint: str) -> Path:
+        """
+        Where a chunk set's embeddings are kept, next to the parsed-chunk cache.
+        Content-addressed (chunk set + embedding model), so a file never changes once
+        written and containers sharing CACHE_DIR can't write conflicting versions.
+        """
+        model = str(getattr(self.embeddings, "model", "")).replace("/", "_")
+        return Path(settings.CACHE_DIR) / "vectors" / f"{fingerprint}_{model}.npy"
+
+    def _embed(self, texts: List[str], fingerprint: str) -> List[List[float]]:
+        """
+        Embeddings for `texts`, loaded from the vector cache when this chunk set was
+        embedded before, otherwise embedded in batched requests and saved there.
+        """
+        # Rows are stored in the fingerprint's (sorted content) order, so any ordering of the set matches
+        order = sorted(range(len(texts)), key=lambda i: texts[i].encode("utf-8"))
+        path = self._vectors_path(fingerprint)
+
+        if path.exists():
+            try:
+                stored = np.load(path)
+                if stored.shape[0] == len(texts):
+                    vectors = np.empty_like(stored)
+                    vectors[order] = stored
+                    logger.info(f"Loaded {len(texts)} cached embeddings from {path}")
+                    return vectors.tolist()
+            except Exception as e:
+                logger.warning(f"Could not load cached embeddings from {path}: {e}")
+
+        vectors = self.embeddings.embed_documents(texts, batch_size=EMBED_BATCH_SIZE)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Written to a temporary name and renamed, so a reader never sees a partial file
+            tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            with open(tmp_path, "wb") as f:
+                np.save(f, np.asarray(vectors, dtype=np.float32)[order])
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"Could not cache embeddings at {path}: {e}")
+        return vectors
+
+    def _open_vector_store(self, collection_name: str) -> Chroma:
+        return Chroma(
+            collection_name=collection_name,
+            embedding_function=self.embeddings,
+            persist_directory=settings.CHROMA_DB_PATH
+        )
         
-    def build_hybrid_retriever(self, docs):
+    def _add_documents(self, vector_store: Chroma, docs, fingerprint: str) -> None:
+        """
+        Embed all chunks in batched requests (ceil(N/100) round-trips), or load their
+        cached vectors, and write them straight into the Chroma collection, in batches
+        the Chroma client accepts.
+        """
+        texts = list(map(page_content, docs))
+        vectors = self._embed(texts, fingerprint)
+        ids = [str(i) for i in range(len(texts))]
+
+        # Chroma rejects empty metadata dicts, so chunks without metadata are added separately
+        with_metadata = [i for i, d in enumerate(docs) if d.metadata]
+        without_metadata = [i for i, d in enumerate(docs) if not d.metadata]
+
+        # Chroma also rejects a single add larger than the client's max batch size
+        max_batch = vector_store._client.get_max_batch_size()
+
+        for indexes, has_metadata in ((with_metadata, True), (without_metadata, False)):
+            for start in range(0, len(indexes), max_batch):
+                batch = indexes[start:start + max_batch]
+                vector_store._collection.add(
+                    ids=[ids[i] for i in batch],
+                    embeddings=[vectors[i] for i in batch],
+                    documents=[texts[i] for i in batch],
+                    metadatas=[docs[i].metadata for i in batch] if has_metadata else None
+                )
+
+    def _vector_store_for(self, fingerprint: str, docs) -> Chroma:
+        """Open (or create and fill) the chunk set's collection. Call with its build lock held."""
+        # One collection per chunk set. The 'settings.CHROMA_DB_PATH' tells it where to save the data on your disk.
+        # If this exact chunk set was embedded before, reuse the persisted vectors
+        # instead of re-embedding every chunk.
+        collection_name = f"{settings.CHROMA_COLLECTION_NAME}_{fingerprint}"
+        vector_store = self._open_vector_store(collection_name)
+        stored = vector_store._collection.count()
+        if stored == len(docs):
+            logger.info(f"Reusing persisted vector store '{collection_name}' ({stored} chunks)")
+        else:
+            if stored:
+                # Partial/stale collection (e.g. an interrupted build): start over
+                vector_store.delete_collection()
+                vector_store = self._open_vector_store(collection_name)
+            self._add_documents(vector_store, docs, fingerprint)
+            logger.info(f"Vector store created at {settings.CHROMA_DB_PATH} ('{collection_name}')")
+        return vector_store
+
+    def _bm25_for(self, fingerprint: str, docs) -> BM25Retriever:
+        """The chunk set's BM25 retriever, cached per chunk set. Call with its build lock held."""
+        with self._bm25_cache_lock:
+            bm25 = self._bm25_cache.get(fingerprint)
+        if bm25 is not None:
+            logger.info("BM25 retriever reused from cache.")
+            return bm25
+
+        bm25 = BM25Retriever.from_documents(docs)
+        with self._bm25_cache_lock:
+            if len(self._bm25_cache) >= BM25_CACHE_SIZE:
+                self._bm25_cache.pop(next(iter(self._bm25_cache)))
+            self._bm25_cache[fingerprint] = bm25
+        logger.info("BM25 retriever initialized.")
+        return bm25
+
+    def build_hybrid_retriever(self, docs, fusion: Optional[str] = None, weights: Optional[List[float]] = None):
         """
         Build a hybrid retriever using BM25 (keyword) and Chroma (semantic) retrieval.
+
+        Args:
+            docs: The document chunks.
+            fusion: "dbsf" (Distribution-Based Score Fusion) or "rrf" (Reciprocal Rank Fusion).
+                Defaults to settings.HYBRID_FUSION.
+            weights: [bm25, vector] weights. Defaults to the settings for the chosen fusion.
         """
+        fusion = (fusion or settings.HYBRID_FUSION).lower()
+        if fusion not in ("dbsf", "rrf"):
+            raise ValueError(f"Unknown fusion method: {fusion}")
+        if weights is None:
+            weights = settings.DBSF_WEIGHTS if fusion == "dbsf" else settings.HYBRID_RETRIEVER_WEIGHTS
+
         try:
             if not docs:
                 logger.warning("No documents provided to build_hybrid_retriever.")
                 return None
 
-            # 1. Create Chroma vector store
-            # The 'settings.CHROMA_DB_PATH' tells it where to save the data on your disk
-            vector_store = Chroma.from_documents(
-                documents=docs,
-                embedding=self.embeddings,
-                persist_directory=settings.CHROMA_DB_PATH
-            )
-            logger.info(f"Vector store created/loaded at {settings.CHROMA_DB_PATH}")
-            
-            # 2. Create BM25 retriever (Keyword search)
-            bm25 = BM25Retriever.from_documents(docs)
-            logger.info("BM25 retriever initialized.")
+            fingerprint = self._fingerprint(docs)
+
+            with self._build_lock(fingerprint):
+                # 1. Create Chroma vector store (one collection per chunk set)
+                vector_store = self._vector_store_for(fingerprint, docs)
+                # 2. Create BM25 retriever (Keyword search), cached per chunk set
+                bm25 = self._bm25_for(fingerprint, docs)
             
             # 3. Create Vector-based retriever (Semantic search)
             # 'k' is the number of chunks to pull; we pull it from your settings
@@ -58,12 +205,19 @@ class RetrieverBuilder:
             
             # 4. Combine them into an Ensemble (Hybrid) Retriever
             # This balances keyword matching with semantic meaning
-            hybrid_retriever = EnsembleRetriever(
-                retrievers=[bm25, vector_retriever],
-                weights=settings.HYBRID_RETRIEVER_WEIGHTS
-            )
+            if fusion == "dbsf":
+                hybrid_retriever = DBSFRetriever(
+                    retrievers=[bm25, vector_retriever],
+                    weights=weights,
+                    k=settings.VECTOR_SEARCH_K
+                )
+            else:
+                hybrid_retriever = EnsembleRetriever(
+                    retrievers=[bm25, vector_retriever],
+                    weights=weights
+                )
             
-            logger.info(f"Hybrid retriever built with weights: {settings.HYBRID_RETRIEVER_WEIGHTS}")
+            logger.info(f"Hybrid retriever built ({fusion.upper()}) with weights: {weights}")
             return hybrid_retriever
 
         except Exception as e:
@@ -0,0 +1,112 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+import numpy as np
+from langchain_classic.retrievers import EnsembleRetriever
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.runnables import RunnableConfig
+
+
+# Each retriever contributes its top (CANDIDATE_FACTOR * k) results to the fusion
+CANDIDATE_FACTOR = 3
+
+# Runs BM25 scoring alongside the vector search on the sync path
+_BM25_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="bm25")
+
+
+def _zscore(scores: np.ndarray) -> np.ndarray:
+    std = scores.std()
+    if std == 0:
+        return np.zeros_like(scores)
+    return (scores - scores.mean()) / std
+
+
+class DBSFRetriever(EnsembleRetriever):
+    """
+    Hybrid BM25 + vector retriever using Distribution-Based Score Fusion.
+
+    Instead of fusing ranks (RRF), each retriever's raw scores are z-score
+    normalized and combined with `weights`. Each retriever contributes its top
+    CANDIDATE_FACTOR * k results; candidates missing from one retriever's
+    results get that retriever's lowest score.
+
+    `retrievers` must be [BM25Retriever, VectorStoreRetriever].
+
+    EnsembleRetriever.invoke/ainvoke call rank_fusion/arank_fusion directly (not
+    _get_relevant_documents), so those are the methods overridden here.
+    """
+
+    # Number of fused documents returned
+    k: int = 10
+
+    def _bm25_scores(self, query: str) -> Tuple[List[Document], np.ndarray]:
+        bm25 = self.retrievers[0]
+        scores = np.asarray(bm25.vectorizer.get_scores(bm25.preprocess_func(query)), dtype=np.float64)
+
+        # Only the best candidates matter: O(N) partial selection instead of fusing the whole corpus
+        n = CANDIDATE_FACTOR * self.k
+        if n >= len(scores):
+            return bm25.docs, scores
+        top = np.argpartition(scores, -n)[-n:]
+        return [bm25.docs[i] for i in top], scores[top]
+
+    def _vector_scores(self, query: str) -> Tuple[List[Document], np.ndarray]:
+        vector_retriever = self.retrievers[1]
+        results = vector_retriever.vectorstore.similarity_search_with_relevance_scores(
+            query, **{**vector_retriever.search_kwargs, "k": CANDIDATE_FACTOR * self.k}
+        )
+        if not results:
+            return [], np.empty(0)
+        docs, scores = zip(*results)
+        return list(docs), np.asarray(scores, dtype=np.float64)
+
+    def _fuse(self, scored: List[Tuple[List[Document], np.ndarray]]) -> List[Document]:
+        # Union of candidates, deduplicated on content (BM25 and Chroma return separate Document objects)
+        index = {}
+        candidates = []
+        for docs, _ in scored:
+            for doc in docs:
+                if doc.page_content not in index:
+                    index[doc.page_content] = len(candidates)
+                    candidates.append(doc)
+        if not candidates:
+            return []
+
+        fused = np.zeros(len(candidates))
+        for (docs, scores), weight in zip(scored, self.weights):
+            if not docs:
+                continue
+            column = np.full(len(candidates), scores.min())
+            column[[index[doc.page_content] for doc in docs]] = scores
+            fused += weight * _zscore(column)
+
+        top = np.argsort(-fused, kind="stable")[:self.k]
+        return [candidates[i] for i in top]
+
+    def rank_fusion(
+        self,
+        query: str,
+        run_manager: CallbackManagerForRetrieverRun,
+        *,
+        config: Optional[RunnableConfig] = None
+    ) -> List[Document]:
+        # BM25 (CPU) and the vector search (embedding request + Chroma) run concurrently
+        bm25_future = _BM25_POOL.submit(self._bm25_scores, query)
+        vector_scored = self._vector_scores(query)
+        return self._fuse([bm25_future.result(), vector_scored])
+
+    async def arank_fusion(
+        self,
+        query: str,
+        run_manager: AsyncCallbackManagerForRetrieverRun,
+        *,
+        config: Optional[RunnableConfig] = None
+    ) -> List[Document]:
+        # Both scorers are blocking (rank_bm25 / Chroma), so run them concurrently off the event loop
+        scored = await asyncio.gather(
+            asyncio.to_thread(self._bm25_scores, query),
+            asyncio.to_thread(self._vector_scores, query)
+        )
+        return self._fuse(list(scored))
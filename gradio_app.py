@@ -1,5 +1,4 @@
 import gradio as gr
-import hashlib
 from typing import List, Dict
 import os
 os.environ["RAPIDOCR_LOG_LEVEL"] = "ERROR"
@@ -8,6 +7,7 @@ from engine_room.builder import RetrieverBuilder
 from agents.workflow import AgentWorkflow
 from config import constants, settings
 from utils.logging import logger
+from utils.file_hashing import get_file_fingerprint, get_file_hashes
 
 # 1) Define some example data 
 #    (i.e. question + paths to documents relevant to that question).
@@ -90,6 +90,7 @@ def main():
 
         # 2) Maintain the session state for retrieving doc changes
         session_state = gr.State({
+            "file_fingerprint": frozenset(),
             "file_hashes": frozenset(),
             "retriever": None
         })
@@ -158,33 +159,36 @@ def main():
                 if not uploaded_files:
                     raise ValueError("❌ No documents uploaded")
 
-                current_hashes = _get_file_hashes(uploaded_files)
-                
-                if state["retriever"] is None or current_hashes != state["file_hashes"]:
-                    logger.info("Processing new/changed documents...")
-                    chunks = processor.process(uploaded_files)
+                # Fast path: same names, sizes and mtimes -> same documents, nothing to read
+                current_fingerprint = get_file_fingerprint(uploaded_files)
+                if state["retriever"] is None or current_fingerprint != state["file_fingerprint"]:
+                    current_hashes = get_file_hashes(uploaded_files)
+
+                    if state["retriever"] is None or current_hashes != state["file_hashes"]:
+                        logger.info("Processing new/changed documents...")
+                        chunks = processor.process(uploaded_files)
+
+                        if not chunks:
+                            raise ValueError("No readable text found in the uploaded documents. Please check the file format.")
+
+                        state["retriever"] = retriever_builder.build_hybrid_retriever(chunks)
 
-                    if not chunks:
-                        raise ValueError("No readable text found in the uploaded documents. Please check the file format.")
-                    
-                    retriever = retriever_builder.build_hybrid_retriever(chunks)
-                    
                     state.update({
-                        "file_hashes": current_hashes,
-                        "retriever": retriever
+                        "file_fingerprint": current_fingerprint,
+                        "file_hashes": current_hashes
                     })
                 
-                result = workflow.full_pipeline(
+                # Stream the draft answer into the UI as it is generated; the last update carries the report
+                for result in workflow.stream_pipeline(
                     question=question_text,
                     retriever=state["retriever"],
                     config={"recursion_limit": 10}
-                )
-                
-                return result["draft_answer"], result["verification_report"], state
+                ):
+                    yield result["draft_answer"], result["verification_report"], state
                     
             except Exception as e:
                 logger.error(f"Processing error: {str(e)}")
-                return f"❌ Error: {str(e)}", "", state
+                yield f"❌ Error: {str(e)}", "", state
 
         submit_btn.click(
             fn=process_question,
@@ -194,13 +198,5 @@ def main():
 
     demo.launch(server_name="127.0.0.1", server_port=5000, share=True)
 
-def _get_file_hashes(uploaded_files: List) -> frozenset:
-    """Generate SHA-256 hashes for uploaded files."""
-    hashes = set()
-    for file in uploaded_files:
-        with open(file.name, "rb") as f:
-            hashes.add(hashlib.sha256(f.read()).hexdigest())
-    return frozenset(hashes)
-
 if __name__ == "__main__":
     main()
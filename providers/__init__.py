@@ -1,4 +1,8 @@
 from .gemini import GeminiClient
 from .openai_fallback import OpenAIClient
+from .factory import get_gemini, get_openai, get_embeddings
+from .health import ProviderHealth, provider_health
+from .latency import LatencyTracker, latency_tracker
+from .routing import hedged_generate, request_key
 
-__all__ = ["GeminiClient", "OpenAIClient"]
\ No newline at end of file
+__all__ = ["GeminiClient", "OpenAIClient", "get_gemini", "get_openai", "get_embeddings", "ProviderHealth", "provider_health", "LatencyTracker", "latency_tracker", "hedged_generate", "request_key"]
\ No newline at end of file
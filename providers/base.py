@@ -1,9 +1,66 @@
 # providers/base.py
+import asyncio
+import threading
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Upper bound on concurrent requests issued by generate_batch
+MAX_BATCH_CONCURRENCY = 8
+
+# Deterministic (temperature=0) responses kept in memory, oldest evicted first
+RESPONSE_CACHE_SIZE = 1024
+_response_cache: Dict[Tuple, str] = {}
+_response_cache_lock = threading.Lock()
 
 class LLMClient(ABC):
+    # Provider key used for health tracking and routing
+    name: str = "llm"
+    # Model identifier; part of the response cache key so a model swap never serves stale answers
+    model_name: str = ""
+
+    def _response_key(
+        self,
+        prompt: str,
+        max_tokens: int,
+        temperature: float,
+        stop: Optional[List[str]],
+        thinking_budget: Optional[int],
+        *extra
+    ) -> Optional[Tuple]:
+        """
+        Cache key for a call, or None when the call isn't deterministic (temperature > 0).
+        `extra` holds provider-specific inputs that change the response (e.g. a context cache name).
+        """
+        if temperature != 0:
+            return None
+        return (self.name, self.model_name, prompt, max_tokens, tuple(stop or ()), thinking_budget, *extra)
+
+    @staticmethod
+    def _cached_response(key: Optional[Tuple]) -> Optional[str]:
+        if key is None:
+            return None
+        return _response_cache.get(key)
+
+    @staticmethod
+    def _cache_response(key: Optional[Tuple], response: str) -> None:
+        # Empty responses (safety blocks, quota hiccups) are not worth repeating
+        if key is None or not response:
+            return
+        with _response_cache_lock:
+            if len(_response_cache) >= RESPONSE_CACHE_SIZE:
+                _response_cache.pop(next(iter(_response_cache)), None)
+            _response_cache[key] = response
+
     @abstractmethod
-    def generate(self, prompt: str, max_tokens: int = 200, temperature: float = 0.0) -> str:
+    def generate(
+        self,
+        prompt: str,
+        max_tokens: int = 200,
+        temperature: float = 0.0,
+        stop: Optional[List[str]] = None,
+        thinking_budget: Optional[int] = None
+    ) -> str:
         """
         Generates text from the LLM.
         
@@ -11,5 +68,49 @@ class LLMClient(ABC):
             prompt: The input text.
             max_tokens: Hard limit on output length (default 200).
             temperature: Randomness control (default 0.0).
+            stop: Optional stop sequences; output ends before the first one.
+            thinking_budget: Optional cap on 'thinking' tokens (0 disables thinking).
+                Ignored by models that don't think.
+        """
+        pass
+
+    async def agenerate(
+        self,
+        prompt: str,
+        max_tokens: int = 200,
+        temperature: float = 0.0,
+        stop: Optional[List[str]] = None,
+        thinking_budget: Optional[int] = None
+    ) -> str:
+        """
+        Async variant of `generate`. Providers with a native async API override this;
+        the default runs the blocking call in a worker thread.
+        """
+        return await asyncio.to_thread(self.generate, prompt, max_tokens, temperature, stop, thinking_budget)
+
+    def generate_stream(
+        self,
+        prompt: str,
+        max_tokens: int = 200,
+        temperature: float = 0.0,
+        stop: Optional[List[str]] = None,
+        thinking_budget: Optional[int] = None
+    ) -> Iterator[str]:
+        """
+        Yields the response in text chunks as they arrive.
+        Closing the generator early stops reading the response.
+        Providers without streaming yield the full `generate` result once.
         """
-        pass
\ No newline at end of file
+        yield self.generate(prompt, max_tokens, temperature, stop, thinking_budget)
+
+    def generate_batch(self, prompts: List[str], **kwargs) -> List[str]:
+        """
+        Generates one response per prompt, in order, with the requests in flight
+        concurrently over the client's shared connection pool.
+        Takes the same keyword arguments as `generate`.
+        """
+        if len(prompts) <= 1:
+            return [self.generate(prompt, **kwargs) for prompt in prompts]
+
+        with ThreadPoolExecutor(max_workers=min(MAX_BATCH_CONCURRENCY, len(prompts))) as executor:
+            return list(executor.map(lambda prompt: self.generate(prompt, **kwargs), prompts))
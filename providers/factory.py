@@ -0,0 +1,33 @@
+# providers/factory.py
+import functools
+from config.settings import settings
+from .gemini import GeminiClient, GeminiEmbeddings
+from .openai_fallback import OpenAIClient
+
+
+@functools.lru_cache(maxsize=1)
+def get_gemini() -> GeminiClient:
+    """
+    Shared Gemini client for all agents.
+    Raises if GOOGLE_API_KEY is missing; lru_cache does not cache the failure.
+    """
+    return GeminiClient(api_key=settings.GOOGLE_API_KEY)
+
+
+@functools.lru_cache(maxsize=1)
+def get_openai() -> OpenAIClient:
+    """
+    Shared OpenAI client for all agents, so its connection pool stays warm.
+    Raises if OPENAI_API_KEY is missing; lru_cache does not cache the failure.
+    """
+    return OpenAIClient(api_key=settings.OPENAI_API_KEY)
+
+
+@functools.lru_cache(maxsize=1)
+def get_embeddings():
+    """
+    Shared Gemini embedding client for the retriever and the semantic LLM cache,
+    so document and query embeddings go through one HTTP session.
+    Raises if GOOGLE_API_KEY is missing; lru_cache does not cache the failure.
+    """
+    return GeminiEmbeddings.get_embeddings(settings.GOOGLE_API_KEY)
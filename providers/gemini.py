@@ -1,9 +1,89 @@
 # providers/gemini.py
+import asyncio
+import datetime
+import functools
+import hashlib
+import logging
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
 import google.generativeai as genai
 from .base import LLMClient
+from utils.compression import count_tokens
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
 
+logger = logging.getLogger(__name__)
+
+# Output budget used when thinking can't be disabled: thinking tokens count against
+# max_output_tokens, so a tiny limit would be spent before the answer is written.
+THINKING_HEADROOM_TOKENS = 1000
+
+_SAFETY_SETTINGS = {k: "BLOCK_NONE" for k in [
+    "HARM_CATEGORY_HARASSMENT",
+    "HARM_CATEGORY_HATE_SPEECH",
+    "HARM_CATEGORY_SEXUALLY_EXPLICIT",
+    "HARM_CATEGORY_DANGEROUS_CONTENT"
+]}
+
+
+# genai.configure mutates SDK-global state, so it runs once per API key under a lock,
+# and GenerativeModel instances are shared by model name across clients
+_SDK_LOCK = threading.Lock()
+_CONFIGURED_KEY: Optional[str] = None
+_MODEL_CACHE: Dict[str, genai.GenerativeModel] = {}
+
+
+def _get_model(api_key: str, model_name: str) -> genai.GenerativeModel:
+    global _CONFIGURED_KEY
+    with _SDK_LOCK:
+        if _CONFIGURED_KEY != api_key:
+            genai.configure(api_key=api_key)
+            _CONFIGURED_KEY = api_key
+            _MODEL_CACHE.clear()
+        model = _MODEL_CACHE.get(model_name)
+        if model is None:
+            model = _MODEL_CACHE[model_name] = genai.GenerativeModel(model_name)
+        return model
+
+
+@functools.lru_cache(maxsize=1)
+def _supports_thinking_config() -> bool:
+    """Older google-generativeai protos have no thinking_config field."""
+    return "thinking_config" in genai.protos.GenerationConfig.meta.fields
+
+
+@functools.lru_cache(maxsize=16)
+def _generation_config(
+    max_tokens: int,
+    temperature: float,
+    stop: Tuple[str, ...] = (),
+    thinking_budget: Optional[int] = None
+) -> "genai.protos.GenerationConfig":
+    """
+    Generation config per distinct setting. Agents reuse a handful of settings, so the
+    config is built once and shared (the SDK copies it into each request).
+    """
+    config = {
+        "max_output_tokens": max_tokens,
+        "temperature": temperature
+    }
+    if stop:
+        config["stop_sequences"] = list(stop)
+    if thinking_budget is not None:
+        if _supports_thinking_config():
+            config["thinking_config"] = {"thinking_budget": thinking_budget}
+        else:
+            config["max_output_tokens"] = max(max_tokens, THINKING_HEADROOM_TOKENS)
+    return genai.protos.GenerationConfig(**config)
+
+
 class GeminiClient(LLMClient):
+    name = "gemini"
+    # Put in a prompt in place of context that was sent ahead as cached content
+    CACHED_CONTEXT_NOTE = "(the document excerpts provided above)"
+    # Context caches created by this client that are still alive
+    MAX_CONTEXT_CACHES = 16
+
     def __init__(self, api_key: str):
         """
         Initialize the Gemini client with the 2026 standard SDK.
@@ -11,61 +91,209 @@ class GeminiClient(LLMClient):
         if not api_key:
             raise ValueError("Google API Key is required for GeminiClient")
             
-        genai.configure(api_key=api_key)
         # Using the stable 2026 flash model for speed and long context
-        self.model = genai.GenerativeModel("gemini-2.5-flash")
+        self.model_name = "gemini-2.5-flash"
+        self.model = _get_model(api_key, self.model_name)
+
+        # Context caching: content hash -> (cache, expiry), cache name -> model bound to it
+        self._context_caches: Dict[str, Tuple[genai.caching.CachedContent, float]] = {}
+        self._cached_models: Dict[str, genai.GenerativeModel] = {}
+        self._cache_lock = threading.Lock()
 
-    def generate(self, prompt: str, max_tokens: int = 1500, temperature: float = 0.0) -> str:
+    def cache_context(self, text: str, ttl_seconds: int = 600, min_tokens: int = 1024) -> Optional[str]:
+        """
+        Upload `text` once as Gemini cached content and return the cache name, to be
+        passed as `cached_content` to later calls that share this context.
+        Identical text reuses the live cache. Returns None if the text is too short to cache.
+        Blocking (network calls): run it in a worker thread from async code.
+        """
+        if count_tokens(text) < min_tokens:
+            return None
+
+        digest = hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+        with self._cache_lock:
+            entry = self._context_caches.get(digest)
+            # Keep a margin so a cache doesn't expire between creation and use
+            if entry is not None and entry[1] - time.monotonic() > 30:
+                return entry[0].name
+
+        # Uploaded outside the lock: _model_for takes it on the event loop and must not wait on I/O
+        cache = genai.caching.CachedContent.create(
+            model=f"models/{self.model_name}",
+            contents=[text],
+            ttl=datetime.timedelta(seconds=ttl_seconds)
+        )
+        # Built from the CachedContent object, so no request is made to look the cache up again
+        model = genai.GenerativeModel.from_cached_content(cached_content=cache)
+
+        # Replaced or evicted caches are left to expire, never deleted: in-flight
+        # verifications may still be using them (a call using a deleted cache fails)
+        with self._cache_lock:
+            replaced = self._context_caches.get(digest)
+            if replaced is not None:
+                self._cached_models.pop(replaced[0].name, None)
+            elif len(self._context_caches) >= self.MAX_CONTEXT_CACHES:
+                evicted, _ = self._context_caches.pop(next(iter(self._context_caches)))
+                self._cached_models.pop(evicted.name, None)
+            self._context_caches[digest] = (cache, time.monotonic() + ttl_seconds)
+            self._cached_models[cache.name] = model
+        return cache.name
+
+    def _model_for(self, cached_content: Optional[str]) -> Optional[genai.GenerativeModel]:
+        """
+        The default model, or the one bound to a context cache created by this client.
+        None if the cache isn't known here (see `_fetch_cached_model`). Never blocks on I/O.
+        """
+        if not cached_content:
+            return self.model
+        with self._cache_lock:
+            return self._cached_models.get(cached_content)
+
+    @staticmethod
+    def _fetch_cached_model(cached_content: str) -> genai.GenerativeModel:
+        """Model for a cache created elsewhere. Looks the cache up over the network."""
+        return genai.GenerativeModel.from_cached_content(cached_content=cached_content)
+
+    @staticmethod
+    def _extract_text(response) -> str:
+        """
+        Robust text extraction: tolerates missing candidates, token cutoffs and safety blocks.
+        """
+        # --- ROBUST CANDIDATE CHECK ---
+        # 1. Verify that the response actually contains data
+        if not hasattr(response, 'candidates') or not response.candidates:
+            logger.warning("Gemini: No candidates returned (possible safety/quota block)")
+            return ""
+
+        candidate = response.candidates[0]
+
+        # 2. Handle 'Finish Reason 2' (Max Tokens) or other partial responses
+        # We manually extract the text parts to avoid the response.text exception
+        try:
+            if candidate.content and candidate.content.parts:
+                text_content = candidate.content.parts[0].text
+                if candidate.finish_reason == 2:
+                    logger.debug("Gemini reached max tokens. Returning partial text.")
+                return text_content
+        except (AttributeError, IndexError):
+            pass
+
+        # 3. Final Fallback to standard accessor
+        try:
+            return response.text if response.text else ""
+        except (ValueError, AttributeError):
+            return ""
+
+    def generate(
+        self,
+        prompt: str,
+        max_tokens: int = 1500,
+        temperature: float = 0.0,
+        stop: Optional[List[str]] = None,
+        thinking_budget: Optional[int] = None,
+        cached_content: Optional[str] = None
+    ) -> str:
         """
         Generates text with robust handling for token cutoffs and safety blocks.
+        `cached_content` is a cache name from `cache_context`; its content precedes the prompt.
         """
+        key = self._response_key(prompt, max_tokens, temperature, stop, thinking_budget, cached_content)
+        cached = self._cached_response(key)
+        if cached is not None:
+            return cached
+
         try:
-            config = genai.types.GenerationConfig(
-                max_output_tokens=max_tokens,
-                temperature=temperature
-            )
+            config = _generation_config(max_tokens, temperature, tuple(stop or ()), thinking_budget)
             
-            response = self.model.generate_content(
+            model = self._model_for(cached_content) or self._fetch_cached_model(cached_content)
+            response = model.generate_content(
                 prompt, 
                 generation_config=config,
-                safety_settings={k: "BLOCK_NONE" for k in [
-                    "HARM_CATEGORY_HARASSMENT", 
-                    "HARM_CATEGORY_HATE_SPEECH", 
-                    "HARM_CATEGORY_SEXUALLY_EXPLICIT", 
-                    "HARM_CATEGORY_DANGEROUS_CONTENT"
-                ]}
+                safety_settings=_SAFETY_SETTINGS
             )
 
-            # --- ROBUST CANDIDATE CHECK ---
-            # 1. Verify that the response actually contains data
-            if not hasattr(response, 'candidates') or not response.candidates:
-                print("--- Gemini Warning: No candidates returned (Possible Safety/Quota block) ---")
-                return ""
-
-            candidate = response.candidates[0]
-
-            # 2. Handle 'Finish Reason 2' (Max Tokens) or other partial responses
-            # We manually extract the text parts to avoid the response.text exception
-            try:
-                if candidate.content and candidate.content.parts:
-                    text_content = candidate.content.parts[0].text
-                    if candidate.finish_reason == 2:
-                        print("--- DEBUG: Gemini reached max tokens. Returning partial text. ---")
-                    return text_content
-            except (AttributeError, IndexError):
-                pass
-
-            # 3. Final Fallback to standard accessor
-            try:
-                return response.text if response.text else ""
-            except (ValueError, AttributeError):
-                return ""
+            text = self._extract_text(response)
+            self._cache_response(key, text)
+            return text
             
         except Exception as e:
             # Combined error handler to prevent app crashes while alerting the workflow
-            print(f"--- Fatal Gemini Error: {e} ---")
+            logger.error("Gemini error: %s", e)
+            raise RuntimeError(f"Gemini Error: {e}")
+
+    async def agenerate(
+        self,
+        prompt: str,
+        max_tokens: int = 1500,
+        temperature: float = 0.0,
+        stop: Optional[List[str]] = None,
+        thinking_budget: Optional[int] = None,
+        cached_content: Optional[str] = None
+    ) -> str:
+        """
+        Native async variant of `generate` (no worker thread is held while waiting).
+        """
+        key = self._response_key(prompt, max_tokens, temperature, stop, thinking_budget, cached_content)
+        cached = self._cached_response(key)
+        if cached is not None:
+            return cached
+
+        try:
+            config = _generation_config(max_tokens, temperature, tuple(stop or ()), thinking_budget)
+
+            # An unknown cache needs a blocking lookup, which must not run on the event loop
+            model = self._model_for(cached_content) or await asyncio.to_thread(self._fetch_cached_model, cached_content)
+            response = await model.generate_content_async(
+                prompt,
+                generation_config=config,
+                safety_settings=_SAFETY_SETTINGS
+            )
+            text = self._extract_text(response)
+            self._cache_response(key, text)
+            return text
+
+        except Exception as e:
+            logger.error("Gemini error: %s", e)
+            raise RuntimeError(f"Gemini Error: {e}")
+
+    def generate_stream(
+        self,
+        prompt: str,
+        max_tokens: int = 1500,
+        temperature: float = 0.0,
+        stop: Optional[List[str]] = None,
+        thinking_budget: Optional[int] = None,
+        cached_content: Optional[str] = None
+    ) -> Iterator[str]:
+        """
+        Streams text chunks. Chunks without text (e.g. safety blocks) are skipped.
+        """
+        config = _generation_config(max_tokens, temperature, tuple(stop or ()), thinking_budget)
+        try:
+            model = self._model_for(cached_content) or self._fetch_cached_model(cached_content)
+            response = model.generate_content(
+                prompt,
+                generation_config=config,
+                safety_settings=_SAFETY_SETTINGS,
+                stream=True
+            )
+        except Exception as e:
             raise RuntimeError(f"Gemini Error: {e}")
 
+        try:
+            for chunk in response:
+                try:
+                    text = chunk.text
+                except (ValueError, AttributeError):
+                    continue
+                if text:
+                    yield text
+        finally:
+            # Cancel the underlying gRPC/REST stream if we stopped reading early
+            cancel = getattr(getattr(response, "_iterator", None), "cancel", None)
+            if callable(cancel):
+                cancel()
+
 class GeminiEmbeddings:
     @staticmethod
     def get_embeddings(api_key: str):
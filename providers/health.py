@@ -0,0 +1,82 @@
+# providers/health.py
+import logging
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ProviderHealth:
+    """
+    Circuit breaker shared by every agent.
+
+    After `threshold` consecutive failures a provider is marked unhealthy for
+    `cooldown` seconds and the router sends traffic straight to the fallback.
+    While a provider is down, a background probe retries it every
+    `probe_interval` seconds and closes the circuit as soon as one succeeds.
+    """
+
+    def __init__(self, threshold: int = 3, cooldown: float = 60.0, probe_interval: float = 10.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.probe_interval = probe_interval
+
+        self.failures_by_provider: Dict[str, int] = {}
+        self.unhealthy_until: Dict[str, float] = {}
+        self._probing = set()
+        self._lock = threading.Lock()
+
+    def is_available(self, name: str) -> bool:
+        return time.monotonic() >= self.unhealthy_until.get(name, 0.0)
+
+    def record_success(self, name: str) -> None:
+        with self._lock:
+            self.failures_by_provider[name] = 0
+            self.unhealthy_until.pop(name, None)
+
+    def record_failure(self, name: str, probe: Optional[Callable[[], object]] = None) -> None:
+        with self._lock:
+            failures = self.failures_by_provider.get(name, 0) + 1
+            self.failures_by_provider[name] = failures
+            if failures < self.threshold:
+                return
+
+            self.unhealthy_until[name] = time.monotonic() + self.cooldown
+            start_probe = probe is not None and name not in self._probing
+            if start_probe:
+                self._probing.add(name)
+
+        logger.warning("%s marked unhealthy for %.0fs after %d consecutive failures", name, self.cooldown, failures)
+        if start_probe:
+            threading.Thread(
+                target=self._probe_loop,
+                args=(name, probe),
+                name=f"health-probe-{name}",
+                daemon=True
+            ).start()
+
+    def _probe_loop(self, name: str, probe: Callable[[], object]) -> None:
+        # Runs until the provider recovers or its cooldown expires (then the next real call decides)
+        try:
+            while not self.is_available(name):
+                time.sleep(self.probe_interval)
+                try:
+                    probe()
+                except Exception as e:
+                    logger.debug("Health probe for %s failed: %s", name, e)
+                    continue
+                logger.info("Health probe for %s succeeded, routing traffic to it again", name)
+                self.record_success(name)
+        finally:
+            with self._lock:
+                self._probing.discard(name)
+
+
+provider_health = ProviderHealth(
+    threshold=settings.CIRCUIT_BREAKER_THRESHOLD,
+    cooldown=settings.CIRCUIT_BREAKER_COOLDOWN,
+    probe_interval=settings.HEALTH_PROBE_INTERVAL
+)
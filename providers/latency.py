@@ -0,0 +1,75 @@
+# providers/latency.py
+import threading
+from collections import deque
+from typing import Deque, Dict, Optional
+
+import numpy as np
+
+from config.settings import settings
+
+
+class LatencyTracker:
+    """
+    Rolling latency windows used to derive per-call timeouts.
+
+    Windows are keyed per provider *and* operation (e.g. "gemini:research"),
+    since a 32-token classification and a 4000-token answer have very different
+    latency profiles. The timeout is p99 of the window times `headroom`, clamped
+    to [floor, ceiling]. Until `min_samples` calls are recorded the ceiling is used.
+
+    The ceiling can be set per operation (`ceilings`, keyed by the part after the
+    provider), so long generations aren't held to the ceiling of short ones.
+    Timed-out calls are recorded at their timeout (see `record_timeout`), so a slow
+    patch raises the timeout instead of pinning it to the p99 of past fast calls.
+    """
+
+    def __init__(
+        self,
+        window: int = 200,
+        headroom: float = 1.3,
+        floor: float = 2.0,
+        ceiling: float = 15.0,
+        min_samples: int = 20,
+        ceilings: Optional[Dict[str, float]] = None
+    ):
+        self.window = window
+        self.headroom = headroom
+        self.floor = floor
+        self.ceiling = ceiling
+        self.ceilings = dict(ceilings or {})
+        self.min_samples = min_samples
+
+        self._windows: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, key: str, seconds: float) -> None:
+        with self._lock:
+            self._windows.setdefault(key, deque(maxlen=self.window)).append(seconds)
+
+    def record_timeout(self, key: str, timeout: float) -> None:
+        """A call that hit its timeout took at least that long."""
+        self.record(key, timeout)
+
+    def ceiling_for(self, key: str) -> float:
+        operation = key.split(":", 1)[-1]
+        return self.ceilings.get(operation, self.ceiling)
+
+    def timeout_for(self, key: str) -> float:
+        with self._lock:
+            samples = list(self._windows.get(key, ()))
+
+        ceiling = self.ceiling_for(key)
+        if len(samples) < self.min_samples:
+            return ceiling
+
+        p99 = float(np.percentile(samples, 99))
+        return min(max(p99 * self.headroom, self.floor), ceiling)
+
+
+latency_tracker = LatencyTracker(
+    window=settings.LLM_LATENCY_WINDOW,
+    headroom=settings.LLM_TIMEOUT_HEADROOM,
+    floor=settings.LLM_TIMEOUT_FLOOR,
+    ceiling=settings.LLM_TIMEOUT_CEILING,
+    ceilings=settings.LLM_TIMEOUT_CEILINGS
+)
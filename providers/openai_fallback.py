@@ -1,29 +1,86 @@
 # providers/openai_fallback.py
+from typing import Iterator, List, Optional
+import httpx
 from openai import OpenAI
 from .base import LLMClient
 # pip install openai
 
 class OpenAIClient(LLMClient):
+    name = "openai"
+
     def __init__(self, api_key: str):
         if not api_key:
             raise ValueError("OpenAI API Key is required for OpenAIClient")
             
-        self.client = OpenAI(api_key=api_key)
+        # Persistent HTTP/2 pool: sockets (and their TLS sessions) are reused across calls
+        self.client = OpenAI(
+            api_key=api_key,
+            http_client=httpx.Client(
+                http2=True,
+                limits=httpx.Limits(max_keepalive_connections=20)
+            )
+        )
         self.model_name = "gpt-4o-mini"
 
-    def generate(self, prompt: str, max_tokens: int = 200, temperature: float = 0.0) -> str:
+    def generate(
+        self,
+        prompt: str,
+        max_tokens: int = 200,
+        temperature: float = 0.0,
+        stop: Optional[List[str]] = None,
+        thinking_budget: Optional[int] = None
+    ) -> str:
         """
         Generates text using OpenAI, matching the signature of GeminiClient for agnostic use.
+        gpt-4o-mini has no thinking mode, so `thinking_budget` is ignored.
         """
+        key = self._response_key(prompt, max_tokens, temperature, stop, thinking_budget)
+        cached = self._cached_response(key)
+        if cached is not None:
+            return cached
+
         try:
             # We apply the strict limits HERE, for every specific request
             response = self.client.chat.completions.create(
                 model=self.model_name,
                 messages=[{"role": "user", "content": prompt}],
                 max_tokens=max_tokens,
-                temperature=temperature
+                temperature=temperature,
+                stop=stop or None
             )
-            return response.choices[0].message.content
+            text = response.choices[0].message.content
+            self._cache_response(key, text)
+            return text
             
         except Exception as e:
-            raise RuntimeError(f"OpenAI Error: {e}")
\ No newline at end of file
+            raise RuntimeError(f"OpenAI Error: {e}")
+
+    def generate_stream(
+        self,
+        prompt: str,
+        max_tokens: int = 200,
+        temperature: float = 0.0,
+        stop: Optional[List[str]] = None,
+        thinking_budget: Optional[int] = None
+    ) -> Iterator[str]:
+        """
+        Streams text chunks. Closing the generator closes the HTTP response.
+        """
+        try:
+            stream = self.client.chat.completions.create(
+                model=self.model_name,
+                messages=[{"role": "user", "content": prompt}],
+                max_tokens=max_tokens,
+                temperature=temperature,
+                stop=stop or None,
+                stream=True
+            )
+        except Exception as e:
+            raise RuntimeError(f"OpenAI Error: {e}")
+
+        try:
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            stream.close()
@@ -0,0 +1,253 @@
+# providers/routing.py
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import threading
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+from config.settings import settings
+from .base import LLMClient
+from .health import provider_health
+from .latency import latency_tracker
+
+logger = logging.getLogger(__name__)
+
+TokenCallback = Callable[[str], None]
+
+
+class _Broadcast:
+    """
+    Partial text of one streamed request, relayed to every caller sharing it.
+    A caller that joins late immediately gets the latest text (callbacks receive
+    the text so far, not deltas).
+    """
+
+    def __init__(self):
+        self._listeners: List[TokenCallback] = []
+        self._text: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def add(self, on_token: TokenCallback) -> None:
+        with self._lock:
+            self._listeners.append(on_token)
+            if self._text is not None:
+                on_token(self._text)
+
+    def __call__(self, text: str) -> None:
+        with self._lock:
+            self._text = text
+            for on_token in self._listeners:
+                on_token(text)
+
+
+class StreamAttempt:
+    """
+    Handed to a streamed `call` (see hedged_generate) for one provider attempt.
+    `emit` relays the text so far until the attempt is abandoned (it failed, timed
+    out, lost or was cancelled); from then on it returns False and relays nothing,
+    and the call should stop reading and close its stream.
+    """
+
+    def __init__(self, on_token: TokenCallback):
+        self.abandoned = threading.Event()
+        self.started = asyncio.Event()  # Set once the first text arrives
+        self._on_token = on_token
+        self._loop = asyncio.get_running_loop()
+        self._lock = threading.Lock()
+
+    def emit(self, text: str) -> bool:
+        # Under the lock, so nothing is relayed once abandon() has returned
+        with self._lock:
+            if self.abandoned.is_set():
+                return False
+            if not self.started.is_set():
+                self._loop.call_soon_threadsafe(self.started.set)
+            self._on_token(text)
+            return True
+
+    def abandon(self) -> None:
+        with self._lock:
+            self.abandoned.set()
+
+    async def wait_started(self, worker: asyncio.Future) -> None:
+        """Return once the first text has arrived or the call has finished."""
+        started = asyncio.ensure_future(self.started.wait())
+        try:
+            await asyncio.wait({started, worker}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            started.cancel()
+
+
+# Singleflight registry: request key -> the task serving it (and its broadcast, if streamed)
+_in_flight: Dict[str, Tuple[asyncio.Task, Optional[_Broadcast]]] = {}
+
+
+def request_key(prompt: str, **constraints) -> str:
+    """Stable key for a prompt plus its generation constraints."""
+    payload = json.dumps({"prompt": prompt, **constraints}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+async def _coalesce(
+    key: str,
+    factory: Callable[[Optional[TokenCallback]], Awaitable[str]],
+    on_token: Optional[TokenCallback] = None
+) -> str:
+    """
+    Concurrent callers with the same key share one in-flight call.
+    For streamed calls (`on_token`), the partial text is relayed to every caller.
+    The lookup and insert have no await between them, so they are atomic on the loop.
+    """
+    entry = _in_flight.get(key)
+    if entry is None:
+        broadcast = _Broadcast() if on_token is not None else None
+        task = asyncio.create_task(factory(broadcast))
+        _in_flight[key] = entry = (task, broadcast)
+        task.add_done_callback(lambda _: _in_flight.pop(key, None))
+    else:
+        logger.debug("Joining in-flight request %s", key[:12])
+
+    task, broadcast = entry
+    if on_token is not None:
+        broadcast.add(on_token)
+
+    # Shield so that one cancelled caller doesn't cancel the call for everyone else
+    return await asyncio.shield(task)
+
+
+async def hedged_generate(
+    call: Union[Callable[[LLMClient], str], Callable[[LLMClient], Awaitable[str]]],
+    primary: Optional[LLMClient],
+    secondary: Optional[LLMClient],
+    hedge_delay: Optional[float] = None,
+    operation: str = "default",
+    key: Optional[str] = None,
+    on_token: Optional[TokenCallback] = None
+) -> str:
+    """
+    Run `call(client)` against the primary, falling back to the secondary.
+    `call` is either a blocking function (run in a worker thread) or an
+    `async def` function (awaited on the loop, e.g. using client.agenerate).
+
+    With `on_token`, the output is streamed: `call(client, attempt)` is a blocking
+    function that passes the text so far to `attempt.emit` (see StreamAttempt) and
+    stops once that returns False. `on_token` only ever sees the current attempt's
+    text; a failover restarts it from the fallback's first chunk.
+
+    - If the primary fails, the secondary is started immediately.
+    - If the primary has not answered within `hedge_delay` seconds (math.inf
+      disables this), the secondary is raced against it (hedged request). The
+      first success wins and the loser is cancelled. Note: a blocking `call`
+      keeps running in its worker thread; only our wait on it is abandoned.
+      Streamed calls are never hedged, since two streams would interleave.
+    - Providers whose circuit is open (see ProviderHealth) are skipped, unless
+      that would leave nothing to try.
+    - Each call is bounded by an adaptive timeout (p99 of recent `operation`
+      calls to that provider, capped by the operation's ceiling, see
+      LatencyTracker). A timeout counts as a failure and is recorded as a sample.
+      Streamed calls are only bounded until their first chunk.
+    - If `key` is given (see request_key), concurrent calls with the same
+      operation and key are coalesced into one.
+
+    Raises the last provider error if every client fails.
+    """
+    if key is not None:
+        # Streamed and non-streamed calls never share a flight: only the former relay partial text
+        return await _coalesce(
+            f"{operation}:{'stream:' if on_token else ''}{key}",
+            lambda relay: hedged_generate(call, primary, secondary, hedge_delay, operation, on_token=relay),
+            on_token
+        )
+
+    if on_token is not None:
+        hedge_delay = math.inf
+    elif hedge_delay is None:
+        hedge_delay = settings.HEDGE_DELAY_SECONDS
+
+    candidates = [c for c in (primary, secondary) if c is not None]
+    if not candidates:
+        raise RuntimeError("No LLM clients are configured.")
+
+    clients = [c for c in candidates if provider_health.is_available(c.name)] or candidates
+    if len(clients) < len(candidates):
+        logger.debug("Skipping unhealthy provider(s); routing to %s", [c.name for c in clients])
+
+    pending = {}
+    errors = []
+
+    async def _run(client: LLMClient) -> str:
+        # A stream's duration grows with the answer, so only its time to first chunk is bounded
+        # (ceiling: LLM_TIMEOUT_CEILINGS["<operation>:first_chunk"], else the default)
+        key = f"{client.name}:{operation}" + (":first_chunk" if on_token is not None else "")
+        timeout = latency_tracker.timeout_for(key)
+        start = time.monotonic()
+        try:
+            try:
+                if on_token is not None:
+                    attempt = StreamAttempt(on_token)
+                    worker = asyncio.ensure_future(asyncio.to_thread(call, client, attempt))
+                    try:
+                        await asyncio.wait_for(attempt.wait_started(worker), timeout=timeout)
+                        latency_tracker.record(key, time.monotonic() - start)
+                        result = await worker
+                    finally:
+                        # Whatever happened to this attempt, its thread must stop relaying text
+                        attempt.abandon()
+                else:
+                    if asyncio.iscoroutinefunction(call):
+                        pending_call = call(client)
+                    else:
+                        pending_call = asyncio.to_thread(call, client)
+                    result = await asyncio.wait_for(pending_call, timeout=timeout)
+                    latency_tracker.record(key, time.monotonic() - start)
+            except asyncio.TimeoutError:
+                latency_tracker.record_timeout(key, timeout)
+                raise TimeoutError(f"{client.name} did not respond within {timeout:.1f}s") from None
+        except Exception:
+            provider_health.record_failure(
+                client.name,
+                # Non-zero temperature so the probe is never answered from the response cache
+                probe=lambda: client.generate("ping", max_tokens=1, temperature=1.0)
+            )
+            raise
+        provider_health.record_success(client.name)
+        return result
+
+    def _launch(client: LLMClient):
+        task = asyncio.create_task(_run(client))
+        pending[task] = client
+
+    _launch(clients.pop(0))
+    try:
+        while pending:
+            done, _ = await asyncio.wait(
+                pending,
+                timeout=hedge_delay if clients and math.isfinite(hedge_delay) else None,
+                return_when=asyncio.FIRST_COMPLETED
+            )
+
+            if not done:
+                logger.debug("No response after %.1fs, hedging with %s", hedge_delay, type(clients[0]).__name__)
+                _launch(clients.pop(0))
+                continue
+
+            failed = False
+            for task in done:
+                client = pending.pop(task)
+                try:
+                    return task.result()
+                except Exception as e:
+                    logger.warning("%s failed: %s", type(client).__name__, e)
+                    errors.append(e)
+                    failed = True
+
+            if failed and clients:
+                _launch(clients.pop(0))
+    finally:
+        for task in pending:
+            task.cancel()
+
+    raise errors[-1]
@@ -0,0 +1,106 @@
+import asyncio
+import time
+import uuid
+
+from langchain_community.retrievers import BM25Retriever
+from langchain_community.vectorstores import Chroma
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from engine_room.fusion import DBSFRetriever
+
+QUERY = "data center power usage effectiveness in Singapore"
+
+TEXTS = [
+    "The Singapore data center reported a power usage effectiveness of 1.13 in 2022.",
+    "Power usage effectiveness (PUE) measures data center energy efficiency.",
+    "Regional average carbon-free energy in Asia Pacific was 12% in 2023.",
+    "DeepSeek-R1 was evaluated on coding benchmarks such as LiveCodeBench.",
+    "The second Singapore facility improved its PUE between 2019 and 2022.",
+    "Water replenishment projects expanded across several watersheds.",
+    "OpenAI o1-mini was used as a baseline for the coding comparison.",
+    "Scope 3 emissions make up most of the total carbon footprint.",
+    "Data center cooling uses recycled water where available.",
+    "Energy efficiency gains came from machine learning based cooling control.",
+    "The report covers fiscal year 2023 operations.",
+    "Codeforces ratings were reported as percentiles.",
+]
+
+
+def _retriever(k: int = 3) -> DBSFRetriever:
+    docs = [Document(page_content=text) for text in TEXTS]
+    bm25 = BM25Retriever.from_documents(docs)
+    store = Chroma.from_documents(
+        docs,
+        DeterministicFakeEmbedding(size=32),
+        collection_name=f"test_{uuid.uuid4().hex}"
+    )
+    return DBSFRetriever(
+        retrievers=[bm25, store.as_retriever(search_kwargs={"k": k})],
+        weights=[0.7, 0.3],
+        k=k
+    )
+
+
+def _dbsf_order(retriever: DBSFRetriever, query: str):
+    fused = retriever._fuse([retriever._bm25_scores(query), retriever._vector_scores(query)])
+    return [doc.page_content for doc in fused]
+
+
+def test_invoke_uses_dbsf():
+    retriever = _retriever()
+    docs = retriever.invoke(QUERY)
+    assert len(docs) <= retriever.k
+    assert [doc.page_content for doc in docs] == _dbsf_order(retriever, QUERY)
+
+
+def test_ainvoke_uses_dbsf():
+    retriever = _retriever()
+    docs = asyncio.run(retriever.ainvoke(QUERY))
+    assert len(docs) <= retriever.k
+    assert [doc.page_content for doc in docs] == _dbsf_order(retriever, QUERY)
+
+
+def _slow_scorers(monkeypatch, delay: float = 0.3):
+    """Make both scorers sleep, keeping their results."""
+    bm25_scores = DBSFRetriever._bm25_scores
+    vector_scores = DBSFRetriever._vector_scores
+
+    def slow_bm25(self, query):
+        time.sleep(delay)
+        return bm25_scores(self, query)
+
+    def slow_vector(self, query):
+        time.sleep(delay)
+        return vector_scores(self, query)
+
+    monkeypatch.setattr(DBSFRetriever, "_bm25_scores", slow_bm25)
+    monkeypatch.setattr(DBSFRetriever, "_vector_scores", slow_vector)
+
+
+def test_invoke_scores_concurrently(monkeypatch):
+    retriever = _retriever()
+    _slow_scorers(monkeypatch)
+    start = time.monotonic()
+    retriever.invoke(QUERY)
+    assert time.monotonic() - start < 0.5
+
+
+def test_ainvoke_scores_concurrently(monkeypatch):
+    retriever = _retriever()
+    _slow_scorers(monkeypatch)
+    start = time.monotonic()
+    asyncio.run(retriever.ainvoke(QUERY))
+    assert time.monotonic() - start < 0.5
+
+
+def test_bm25_candidates_pruned_to_top_scores():
+    from engine_room.fusion import CANDIDATE_FACTOR
+
+    retriever = _retriever(k=2)
+    bm25 = retriever.retrievers[0]
+    all_scores = sorted(bm25.vectorizer.get_scores(bm25.preprocess_func(QUERY)), reverse=True)
+
+    docs, scores = retriever._bm25_scores(QUERY)
+    assert len(docs) == len(scores) == CANDIDATE_FACTOR * retriever.k
+    assert sorted(scores, reverse=True) == all_scores[:CANDIDATE_FACTOR * retriever.k]
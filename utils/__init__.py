@@ -1,3 +1,7 @@
 from .logging import logger
+from .llm_cache import LLMCache
+from .compression import compress_context, count_tokens
+from .aio import get_loop, run_sync
+from .file_hashing import hash_file, get_file_hashes, get_file_fingerprint
 
-__all__ = ["logger"]
\ No newline at end of file
+__all__ = ["logger", "LLMCache", "compress_context", "count_tokens", "get_loop", "run_sync", "hash_file", "get_file_hashes", "get_file_fingerprint"]
\ No newline at end of file
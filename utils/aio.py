@@ -0,0 +1,32 @@
+import asyncio
+import threading
+from typing import Awaitable, Optional, TypeVar
+
+T = TypeVar("T")
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_thread: Optional[threading.Thread] = None
+_lock = threading.Lock()
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """
+    Return the process-wide background event loop, starting it on first use.
+    Running every pipeline on one loop lets concurrent requests share
+    in-flight work (see providers.routing).
+    """
+    global _loop, _loop_thread
+    with _lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            _loop_thread = threading.Thread(target=_loop.run_forever, name="docchat-event-loop", daemon=True)
+            _loop_thread.start()
+    return _loop
+
+
+def run_sync(coro: Awaitable[T]) -> T:
+    """Run a coroutine on the shared loop from synchronous code and block until it finishes."""
+    loop = get_loop()
+    if threading.current_thread() is _loop_thread:
+        raise RuntimeError("run_sync() cannot be called from the shared event loop thread")
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
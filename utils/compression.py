@@ -0,0 +1,105 @@
+import functools
+import re
+import time
+from operator import attrgetter
+from typing import List, Optional
+
+import numpy as np
+import tiktoken
+from langchain_core.documents import Document
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from .logging import logger
+
+# Sentence boundaries, plus line breaks (Docling markdown tables and lists are line-oriented)
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+|\n+")
+
+# C-level attribute access for joining Document contents
+page_content = attrgetter("page_content")
+
+
+# After a failed encoder load, token counts are estimated for this long before retrying
+_ENCODER_RETRY_SECONDS = 300.0
+_encoder_failed_at: Optional[float] = None
+
+
+@functools.lru_cache(maxsize=1)
+def _load_encoder() -> "tiktoken.Encoding":
+    # Downloads cl100k_base on first use unless it is in TIKTOKEN_CACHE_DIR (lru_cache doesn't cache errors)
+    return tiktoken.encoding_for_model("gpt-4")
+
+
+def _encoder() -> Optional["tiktoken.Encoding"]:
+    """The tokenizer, or None while it can't be loaded (e.g. no network to fetch the encoding)."""
+    global _encoder_failed_at
+    if _encoder_failed_at is not None and time.monotonic() - _encoder_failed_at < _ENCODER_RETRY_SECONDS:
+        return None
+    try:
+        encoder = _load_encoder()
+    except Exception as e:
+        _encoder_failed_at = time.monotonic()
+        logger.warning("Could not load the tiktoken encoding, estimating tokens as characters / 4: {}", e)
+        return None
+    _encoder_failed_at = None
+    return encoder
+
+
+def _estimate_tokens(text: str) -> int:
+    return (len(text) + 3) // 4
+
+
+def count_tokens(text: str) -> int:
+    """Approximate token count (tiktoken's GPT-4 encoding; close enough for budgets and thresholds)."""
+    encoder = _encoder()
+    if encoder is None:
+        return _estimate_tokens(text)
+    return len(encoder.encode(text))
+
+
+def compress_context(query: str, docs: List[Document], budget_tokens: int = 800) -> str:
+    """
+    Extractive prompt compression.
+
+    Scores every sentence of the joined documents by TF-IDF cosine similarity to
+    `query` and keeps the best ones, in their original order, until `budget_tokens`
+    is reached. Context that already fits the budget is returned unchanged.
+    """
+    context = "\n\n".join(map(page_content, docs))
+
+    sentences = [s.strip() for s in _SENTENCE_SPLIT.split(context) if s.strip()]
+    if not sentences:
+        return context
+
+    encoder = _encoder()
+    if encoder is None:
+        lengths = [_estimate_tokens(sentence) for sentence in sentences]
+    else:
+        lengths = [len(tokens) for tokens in encoder.encode_batch(sentences)]
+    if sum(lengths) <= budget_tokens:
+        return context
+
+    try:
+        vectorizer = TfidfVectorizer(stop_words="english")
+        sentence_matrix = vectorizer.fit_transform(sentences)
+        # Rows are L2-normalised, so the dot product is the cosine similarity
+        scores = (sentence_matrix @ vectorizer.transform([query]).T).toarray().ravel()
+    except ValueError:
+        # Empty vocabulary (e.g. only numbers/stop words): keep the leading sentences
+        scores = np.zeros(len(sentences))
+
+    selected = []
+    used = 0
+    for idx in np.argsort(-scores, kind="stable"):
+        if used + lengths[idx] > budget_tokens:
+            continue
+        selected.append(idx)
+        used += lengths[idx]
+
+    if not selected:
+        # Even the best sentence is over budget: truncate it
+        best = int(np.argmax(scores))
+        if encoder is None:
+            return sentences[best][:4 * budget_tokens]
+        return encoder.decode(encoder.encode(sentences[best])[:budget_tokens])
+
+    return "\n".join(sentences[i] for i in sorted(selected))
@@ -0,0 +1,83 @@
+import hashlib
+import mmap
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
+try:
+    from blake3 import blake3
+except ImportError:  # blake3 is optional; hashlib's blake2b is used instead
+    blake3 = None
+
+# Upper bound on files hashed concurrently
+MAX_HASH_WORKERS = 8
+
+# Digests of files already hashed, keyed by (path, mtime_ns, size); oldest entries are evicted first
+HASH_CACHE_SIZE = 256
+_HASH_CACHE: Dict[Tuple[str, int, int], str] = {}
+_HASH_CACHE_LOCK = threading.Lock()
+
+
+def _hash_contents(path: str) -> str:
+    """
+    Content hash of a file, used only as a cache key (not for security).
+    BLAKE3 over a memory map (SIMD, multithreaded) when installed, otherwise
+    stdlib BLAKE2b over a memory map. Both are faster than SHA-256.
+    """
+    if blake3 is not None:
+        h = blake3(max_threads=blake3.AUTO)
+        h.update_mmap(path)
+        return h.hexdigest()
+
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb", buffering=0) as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            # mmap can't map an empty file
+            return h.hexdigest()
+        # Hash straight from the page cache: no userspace read buffer, and the kernel
+        # pages the file in while blake2b runs
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            h.update(mm)
+    return h.hexdigest()
+
+
+def hash_file(path: str) -> str:
+    """
+    Content hash of a file, memoized on (path, mtime, size) so re-submitting
+    unchanged uploads doesn't read them again.
+    """
+    st = os.stat(path)
+    key = (path, st.st_mtime_ns, st.st_size)
+    digest = _HASH_CACHE.get(key)
+    if digest is None:
+        digest = _hash_contents(path)
+        with _HASH_CACHE_LOCK:
+            if len(_HASH_CACHE) >= HASH_CACHE_SIZE:
+                _HASH_CACHE.pop(next(iter(_HASH_CACHE)), None)
+            _HASH_CACHE[key] = digest
+    return digest
+
+
+def get_file_hashes(uploaded_files: List) -> frozenset:
+    """Content hashes of the uploaded files, used to detect document changes between questions."""
+    paths = [file.name for file in uploaded_files]
+    if len(paths) <= 1:
+        return frozenset(map(hash_file, paths))
+
+    # hashlib releases the GIL while hashing, so threads overlap disk reads and hashing
+    with ThreadPoolExecutor(max_workers=min(MAX_HASH_WORKERS, len(paths))) as executor:
+        return frozenset(executor.map(hash_file, paths))
+
+
+def get_file_fingerprint(uploaded_files: List) -> frozenset:
+    """
+    Cheap identity of the uploads from (name, size, mtime) alone, without reading them.
+    Equal fingerprints mean the documents are unchanged; a different fingerprint
+    may still be the same content (e.g. a re-upload), which get_file_hashes settles.
+    """
+    fingerprint = set()
+    for file in uploaded_files:
+        st = os.stat(file.name)
+        fingerprint.add((os.path.basename(file.name), st.st_size, st.st_mtime_ns))
+    return frozenset(fingerprint)
@@ -2,7 +2,8 @@
 Seperate utility script to print out agentic workflow of application.  Recommend running terminal from root as a module using the "-m" like: "python -m utils.generate_graph"
 '''
 
-from agents import AgentWorkflow 
+from agents import AgentWorkflow
+import hashlib
 import os
 
 # 1. Initialize your class
@@ -10,28 +11,50 @@ app = AgentWorkflow()
 
 # Determine the directory where this script is located (the 'utils' folder)
 utils_folder = os.path.dirname(__file__)
+mermaid_path = os.path.join(utils_folder, "workflow_mermaid.png")
+classic_path = os.path.join(utils_folder, "workflow_classic.png")
+hash_path = os.path.join(utils_folder, "workflow_graph.sha")
+
+# 2. Skip rendering if the graph hasn't changed since the PNGs were saved
+# The Mermaid source is built locally and fully describes the graph; rendering it
+# is what costs a network round-trip (Mermaid) or a graphviz subprocess (classic)
+graph = app.compiled_workflow.get_graph()
+graph_hash = hashlib.blake2b(graph.draw_mermaid().encode("utf-8"), digest_size=16).hexdigest()
+
+stored_hash = None
+if os.path.exists(hash_path):
+    with open(hash_path) as f:
+        stored_hash = f.read().strip()
+
+def _is_current(path: str) -> bool:
+    return stored_hash == graph_hash and os.path.exists(path)
 
-# 2. Get the graphs from the compiled workflow
+# 3. Get the graphs from the compiled workflow
 # Modern Mermaid version
-mermaid_png = app.compiled_workflow.get_graph().draw_mermaid_png()
+if _is_current(mermaid_path):
+    print("workflow_mermaid.png is up to date, skipping.")
+else:
+    mermaid_png = graph.draw_mermaid_png()
+    with open(mermaid_path, "wb") as f:
+        f.write(mermaid_png)
+    print("Mermaid graph saved: workflow_mermaid.png")
 
 # Legacy/Classic version
 # Note: This usually requires 'pygraphviz' or 'graphviz' installed on your system
-try:
-    classic_png = app.compiled_workflow.get_graph().draw_png()
-except Exception as e:
-    print(f"Warning: Could not generate classic draw_png. You may need graphviz installed. Error: {e}")
-    classic_png = None
-
-# 3. Save to the 'utils' folder
-mermaid_path = os.path.join(utils_folder, "workflow_mermaid.png")
-with open(mermaid_path, "wb") as f:
-    f.write(mermaid_png)
-
-if classic_png:
-    classic_path = os.path.join(utils_folder, "workflow_classic.png")
-    with open(classic_path, "wb") as f:
-        f.write(classic_png)
-    print(f"Flow graphs saved in utils: \n - workflow_mermaid.png \n - workflow_classic.png")
+if _is_current(classic_path):
+    print("workflow_classic.png is up to date, skipping.")
 else:
-    print(f"Only Mermaid graph saved: workflow_mermaid.png")
\ No newline at end of file
+    try:
+        classic_png = graph.draw_png()
+        with open(classic_path, "wb") as f:
+            f.write(classic_png)
+        print("Classic graph saved: workflow_classic.png")
+    except Exception as e:
+        print(f"Warning: Could not generate classic draw_png. You may need graphviz installed. Error: {e}")
+        # Don't leave a PNG of an older graph behind that the new hash would vouch for
+        if os.path.exists(classic_path):
+            os.remove(classic_path)
+
+# 4. Record which graph the saved PNGs show
+with open(hash_path, "w") as f:
+    f.write(graph_hash)
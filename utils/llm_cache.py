@@ -0,0 +1,179 @@
+import asyncio
+import hashlib
+import json
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .logging import logger
+
+try:
+    import redis
+except ImportError:  # Redis is optional; the in-memory store is always used
+    redis = None
+
+
+class LLMCache:
+    """
+    Two-level cache for deterministic (temperature=0) LLM calls.
+
+    1. Exact: sha256 of the prompt -> response. In-memory dict, mirrored to Redis when configured.
+    2. Semantic: query embeddings grouped by a scope key (e.g. a hash of the passages).
+       A lookup hits when the cosine similarity to a stored query in the same scope exceeds the threshold.
+
+    Both levels are bounded: the oldest exact entry, scope, or query within a scope is evicted first.
+    Use `aget`/`aset` from async code so Redis round-trips run off the event loop.
+    """
+
+    def __init__(
+        self,
+        embeddings=None,
+        threshold: float = 0.95,
+        redis_url: Optional[str] = None,
+        namespace: str = "llm_cache",
+        max_entries: int = 4096,
+        max_scopes: int = 256,
+        max_scope_entries: int = 256
+    ):
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.max_scopes = max_scopes
+        self.max_scope_entries = max_scope_entries
+
+        self._store: Dict[str, str] = {}
+        # Per scope: preallocated (capacity, dim) float32 matrix of L2-normalized query embeddings.
+        # The first _counts[scope] rows are filled, row i <-> _values[scope][i].
+        self._vectors: Dict[str, np.ndarray] = {}
+        self._counts: Dict[str, int] = {}
+        self._values: Dict[str, List[str]] = {}
+
+        self._redis = None
+        if redis_url:
+            if redis is None:
+                logger.warning("REDIS_URL is set but the 'redis' package is not installed. Using in-memory cache only.")
+            else:
+                self._redis = redis.Redis.from_url(redis_url, decode_responses=True)
+
+    @staticmethod
+    def cache_key(prompt: str, temperature: float = 0.0) -> str:
+        """Exact-match key. Only safe for deterministic calls (temperature=0)."""
+        payload = json.dumps({"prompt": prompt, "temp": temperature}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _remember(self, key: str, value: str) -> None:
+        if key not in self._store and len(self._store) >= self.max_entries:
+            self._store.pop(next(iter(self._store)), None)
+        self._store[key] = value
+
+    def _redis_get(self, key: str) -> Optional[str]:
+        try:
+            return self._redis.get(f"{self.namespace}:{key}")
+        except Exception as e:
+            logger.warning("LLMCache: Redis lookup failed: {}", e)
+            return None
+
+    def _redis_set(self, key: str, value: str) -> None:
+        try:
+            self._redis.set(f"{self.namespace}:{key}", value)
+        except Exception as e:
+            logger.warning("LLMCache: Redis write failed: {}", e)
+
+    def get(self, key: str) -> Optional[str]:
+        if key in self._store:
+            return self._store[key]
+
+        if self._redis is not None:
+            value = self._redis_get(key)
+            if value is not None:
+                self._remember(key, value)
+                return value
+
+        return None
+
+    def set(self, key: str, value: str) -> None:
+        self._remember(key, value)
+
+        if self._redis is not None:
+            self._redis_set(key, value)
+
+    async def aget(self, key: str) -> Optional[str]:
+        """`get` for async callers: memory hits stay on the loop, Redis runs in a worker thread."""
+        if key in self._store:
+            return self._store[key]
+
+        if self._redis is not None:
+            value = await asyncio.to_thread(self._redis_get, key)
+            if value is not None:
+                self._remember(key, value)
+                return value
+
+        return None
+
+    async def aset(self, key: str, value: str) -> None:
+        """`set` for async callers: the Redis write runs in a worker thread."""
+        self._remember(key, value)
+
+        if self._redis is not None:
+            await asyncio.to_thread(self._redis_set, key, value)
+
+    def embed(self, text: str) -> Optional[np.ndarray]:
+        """Embed a query for semantic lookups. Returns None if no embedding model is available."""
+        if self.embeddings is None:
+            return None
+
+        try:
+            return np.asarray(self.embeddings.embed_query(text), dtype=np.float32)
+        except Exception as e:
+            logger.warning("LLMCache: Could not embed query: {}", e)
+            return None
+
+    @staticmethod
+    def _normalize(vector: np.ndarray) -> np.ndarray:
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def semantic_get(self, vector: Optional[np.ndarray], scope: str) -> Optional[str]:
+        """Return the value stored for the most similar query in `scope`, if it clears the threshold."""
+        if vector is None or scope not in self._vectors:
+            return None
+
+        # Rows are normalized at insert time, so one matrix-vector product gives every cosine similarity
+        sims = self._vectors[scope][:self._counts[scope]] @ self._normalize(vector)
+
+        best = int(np.argmax(sims))
+        if sims[best] > self.threshold:
+            logger.debug("LLMCache: Semantic hit (similarity={:.3f})", sims[best])
+            return self._values[scope][best]
+        return None
+
+    def semantic_set(self, vector: Optional[np.ndarray], scope: str, value: str) -> None:
+        if vector is None:
+            return
+
+        row = self._normalize(np.asarray(vector, dtype=np.float32))
+        matrix = self._vectors.get(scope)
+        if matrix is None:
+            if len(self._vectors) >= self.max_scopes:
+                oldest = next(iter(self._vectors))
+                del self._vectors[oldest], self._counts[oldest], self._values[oldest]
+            matrix = self._vectors[scope] = np.empty((min(16, self.max_scope_entries), row.shape[0]), dtype=np.float32)
+            self._counts[scope] = 0
+            self._values[scope] = []
+
+        count = self._counts[scope]
+        values = self._values[scope]
+        if count == self.max_scope_entries:
+            # Full: drop the oldest query (shift in place, no reallocation)
+            matrix[:-1] = matrix[1:]
+            values.pop(0)
+            count -= 1
+        elif count == len(matrix):
+            # Grow geometrically so inserts are amortized O(dim), not a copy of the whole matrix
+            grown = np.empty((min(2 * len(matrix), self.max_scope_entries), matrix.shape[1]), dtype=np.float32)
+            grown[:count] = matrix[:count]
+            matrix = self._vectors[scope] = grown
+
+        matrix[count] = row
+        values.append(value)
+        self._counts[scope] = count + 1
@@ -1,8 +1,17 @@
+import sys
+
 from loguru import logger
 
+from config.settings import settings
+
+# Queued (enqueue=True) sinks: callers only put the record on a queue and a background
+# thread does the blocking write, so concurrent requests don't serialize on stderr/file locks
+logger.remove()
+logger.add(sys.stderr, level=settings.LOG_LEVEL, enqueue=True)
 logger.add(
     "app.log",
     rotation="10 MB",
     retention="30 days",
-    format="{time:YYYY-MM-DD HH:mm:ss} | {level} | {message}"
-)
\ No newline at end of file
+    format="{time:YYYY-MM-DD HH:mm:ss} | {level} | {message}",
+    enqueue=True
+)